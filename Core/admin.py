@@ -44,7 +44,7 @@ class sendhawalaAdmin(admin.ModelAdmin):
                    'amount', 'currency', 'status', 'created_at']
     list_filter = ['status', 'currency', 'created_at']
     search_fields = ['sender_name', 'receiver_name', 'hawala_number']
-    readonly_fields = ['send_hawala_id', 'created_at', 'updated_at']
+    readonly_fields = ['send_hawala_id', 'receiver_province', 'exchanger_province', 'created_at', 'updated_at']
     fieldsets = (
         ('Basic Information', {
             'fields': ('hawala_number', 'sender_name', 'receiver_name', 'sender_phone')
@@ -53,7 +53,7 @@ class sendhawalaAdmin(admin.ModelAdmin):
             'fields': ('amount', 'currency', 'hawala_fee', 'hawala_fee_currency')
         }),
         ('Location', {
-            'fields': ('receiver_location', 'exchanger_location')
+            'fields': ('receiver_location', 'exchanger_location', 'receiver_province', 'exchanger_province')
         }),
         ('Status', {
             'fields': ('status',)
@@ -399,22 +399,9 @@ class ReceiveHawalaAdmin(admin.ModelAdmin):
             obj.dates = send_hawala.created_at
             
             # Handle location fields
-            if send_hawala.receiver_location:
-                try:
-                    receiver_location = Province.objects.get(
-                        name__iexact=send_hawala.receiver_location, is_active=True
-                    )
-                    obj.receiver_location = receiver_location
-                except Province.DoesNotExist:
-                    pass
-            
-            if send_hawala.exchanger_location:
-                try:
-                    exchanger_location = Province.objects.get(
-                        name__iexact=send_hawala.exchanger_location, is_active=True
-                    )
-                    obj.exchanger_location = exchanger_location
-                except Province.DoesNotExist:
-                    pass
+            if send_hawala.receiver_province_id is None or send_hawala.exchanger_province_id is None:
+                send_hawala.assign_provinces()
+            obj.receiver_location_id = send_hawala.receiver_province_id
+            obj.exchanger_location_id = send_hawala.exchanger_province_id
         
         super().save_model(request, obj, form, change)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
 
 
 class CoreConfig(AppConfig):
@@ -7,3 +8,9 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import Core.signals
+        from .checks import check_shared_cache
+
+        # Servers like gunicorn do not run system checks, refuse to start instead
+        errors = [message for message in check_shared_cache() if message.is_serious()]
+        if errors:
+            raise ImproperlyConfigured(errors[0].msg)
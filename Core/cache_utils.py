@@ -0,0 +1,83 @@
+"""
+Version counters kept in the shared Django cache.
+
+Process-local indexes (provinces, currencies, rates, ...) remember the version
+they were built from and rebuild themselves once another process bumps it.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{}'
+
+
+def get_version(name):
+    """Current version of a resource"""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a version lost on cache eviction never
+        # comes back equal to one a process has already built from
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    """Invalidate everything built from the current version of a resource"""
+    key = VERSION_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(name)
+        cache.incr(key)
+
+
+def version_etag(names, variant=''):
+    """Strong ETag of a response built from the given resources; `variant` tells apart URLs"""
+    versions = '-'.join(str(get_version(name)) for name in names)
+    digest = hashlib.md5(f'{versions}|{variant}'.encode()).hexdigest()[:16]
+    return f'"{digest}"'
+
+
+def bump_version_on_commit(name):
+    """
+    Bump once the surrounding transaction commits. Bumping earlier would let
+    a process rebuild from rows that may still be rolled back.
+    """
+    transaction.on_commit(lambda: bump_version(name))
+
+
+class VersionedCache:
+    """
+    Values built from a versioned resource, cached under the resource version.
+
+    Lookups go to a per-process memo first and then to the shared cache, so
+    after the first build each worker answers from memory until the version
+    is bumped. Old versions are never read again and simply expire.
+    """
+
+    def __init__(self, version_name, timeout=None):
+        self.version_name = version_name
+        self.timeout = timeout
+        self._local = {}
+
+    def get(self, name, build):
+        """Cached value of `name`, calling build() on a miss"""
+        version = get_version(self.version_name)
+        local = self._local.get(name)
+        if local is not None and local[0] == version:
+            return local[1]
+
+        key = f'{self.version_name}:{version}:{name}'
+        value = cache.get(key)
+        if value is None:
+            value = build()
+            cache.set(key, value, self.timeout)
+        self._local[name] = (version, value)
+        return value
+
+    def clear(self):
+        self._local = {}
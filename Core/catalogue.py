@@ -0,0 +1,98 @@
+"""
+Compact, precompressed catalogue of the active currencies for app start.
+
+The catalogue is a header of columns and one row per currency, built from
+the currency registry for the requested field sets. Each variant is encoded
+to JSON once per catalogue version together with its gzip (and, when the
+optional brotli package is installed, brotli) compression, and kept by a
+VersionedCache, so a request picks ready bytes from memory.
+
+The catalogue carries no rates, so it has its own version, bumped by
+currency saves and deletes but not by exchange rate updates: clients keep
+their 304s while rates move.
+"""
+import gzip
+import json
+
+from django.conf import settings
+
+from .cache_utils import VersionedCache
+from .currencies import currency_registry
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+VERSION_NAME = 'catalogue'
+# Currency fields the catalogue does not show; saves of only these keep it
+UNLISTED_FIELDS = {'exchange_rate', 'updated_at'}
+
+FIELD_SETS = {
+    'id': ('id',),
+    'code': ('code',),
+    'symbol': ('symbol',),
+    'names': ('name', 'name_english', 'name_farsi'),
+    'popular': ('is_popular',),
+    'default': ('is_default',),
+}
+DEFAULT_FIELD_SETS = ('code', 'symbol', 'names', 'popular')
+
+# Preferred first; brotli only when it can be produced
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+catalogue_payloads = VersionedCache(VERSION_NAME, timeout=settings.CURRENCY_CATALOGUE_CACHE_TIMEOUT)
+
+
+def parse_field_sets(value):
+    """
+    Canonical tuple of field set names from a comma separated list (the
+    default sets when empty). Raises ValueError naming unknown sets.
+    """
+    names = {name.strip().lower() for name in (value or '').split(',') if name.strip()}
+    if not names:
+        return DEFAULT_FIELD_SETS
+    unknown = names - set(FIELD_SETS)
+    if unknown:
+        raise ValueError(f"Unknown field sets: {', '.join(sorted(unknown))}. "
+                         f"Choose from {', '.join(FIELD_SETS)}.")
+    return tuple(name for name in FIELD_SETS if name in names)
+
+
+def choose_encoding(accept_encoding):
+    """Best encoding of ENCODINGS the client accepts (Accept-Encoding header), or None for identity"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def build_catalogue(field_sets):
+    """Catalogue body for the given field sets, encoded and compressed: {None: json, encoding: bytes}"""
+    columns = [field for name in field_sets for field in FIELD_SETS[name]]
+    payload = {
+        'fields': columns,
+        'currencies': [[getattr(currency, field) for field in columns] for currency in currency_registry.snapshot().active],
+    }
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    bodies = {None: body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(body, quality=11)
+    return bodies
+
+
+def get_catalogue(field_sets):
+    """Catalogue bodies of the current currencies version"""
+    return catalogue_payloads.get(f"catalogue:{','.join(field_sets)}", lambda: build_catalogue(field_sets))
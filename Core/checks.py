@@ -0,0 +1,44 @@
+"""
+System checks for the settings the in-process indexes depend on.
+
+Every index (provinces, currencies, quotes, rate payloads, ...) rebuilds when
+its version counter in the default cache moves. With a per-process cache a
+bump made by another process (a Celery worker, another web worker) is never
+seen, and the index serves stale data until restart.
+"""
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+PER_PROCESS_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def web_concurrency():
+    """Number of web worker processes, as announced by WEB_CONCURRENCY (gunicorn, uvicorn)"""
+    try:
+        return int(os.environ.get('WEB_CONCURRENCY', 1))
+    except ValueError:
+        return 1
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend not in PER_PROCESS_CACHE_BACKENDS:
+        return []
+    hint = "Set CACHE_BACKEND and CACHE_LOCATION to a shared backend such as Redis."
+    if web_concurrency() > 1:
+        return [Error(
+            f"The default cache ({backend}) is per process but WEB_CONCURRENCY is {web_concurrency()}: "
+            "version bumps would not reach the other workers.",
+            hint=hint, id='Core.E001',
+        )]
+    return [Warning(
+        f"The default cache ({backend}) is per process: changes made by Celery workers or "
+        "other processes will not invalidate this process's indexes.",
+        hint=hint, id='Core.W001',
+    )]
@@ -0,0 +1,29 @@
+"""
+Conditional GET (ETag) for read endpoints whose data is covered by version
+counters (Core.cache_utils).
+
+The ETag is derived from the resource versions and the request URL, so an
+unchanged resource is answered with 304 Not Modified after a few cache
+lookups, before the view queries or serializes anything. No Last-Modified is
+sent: its one second resolution would answer If-Modified-Since with a stale
+304 after two bumps within the same second, which a fetch followed by the
+rate sync routinely does.
+"""
+from django.views.decorators.http import condition
+
+from .cache_utils import version_etag
+
+
+def versioned_condition(*version_names, variant=None):
+    """
+    View decorator for responses built from the given versioned resources.
+    `variant(request)` tells apart representations of one URL (e.g. content
+    encodings), which must not share a strong ETag.
+    """
+    def etag(request, *args, **kwargs):
+        key = request.get_full_path()
+        if variant is not None:
+            key = f'{key}|{variant(request) or ""}'
+        return version_etag(version_names, key)
+
+    return condition(etag_func=etag)
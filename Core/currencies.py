@@ -0,0 +1,111 @@
+"""
+Process-wide registry of currencies.
+
+All Currency rows are loaded once per process and indexed by id, code and
+symbol, so the default currency and currency lookups in hot paths
+(sendhawala.save, conversions, serializers) cost no query. The registry is
+rebuilt whenever the shared 'currencies' version is bumped, which happens
+on Currency save / delete and on bulk exchange rate updates.
+
+Lookups return copies, so callers may modify (and save) what they get
+without touching the registry. snapshot() hands out the shared instances for
+read-only bulk lookups.
+"""
+import copy
+import threading
+
+from django.db import transaction
+
+from .cache_utils import bump_version_on_commit, get_version
+from .models import Currency
+
+VERSION_NAME = 'currencies'
+
+
+class CurrencySnapshot:
+    """Currencies indexed by id, code and symbol"""
+
+    def __init__(self, currencies):
+        self.currencies = currencies
+        self.by_id = {currency.id: currency for currency in currencies}
+        self.by_code = {currency.code.upper(): currency for currency in currencies}
+        self.by_symbol = {}
+        for currency in currencies:
+            self.by_symbol.setdefault(currency.symbol, []).append(currency)
+        self.default = next((currency for currency in currencies if currency.is_default), None)
+        self.active = [currency for currency in currencies if currency.is_active]
+
+
+class CurrencyRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = None
+        self._local = threading.local()
+
+    def _load(self):
+        return CurrencySnapshot(list(Currency.objects.order_by('code')))
+
+    def _current(self):
+        if getattr(self._local, 'uncommitted', False):
+            if transaction.get_connection().in_atomic_block:
+                # Currencies changed in this thread's open transaction: read
+                # what it sees, but never share rows that may be rolled back
+                return self._load()
+            # The transaction was rolled back, the shared snapshot still holds
+            self._local.uncommitted = False
+        version = get_version(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._snapshot = self._load()
+                    self._version = version
+        return self._snapshot
+
+    def snapshot(self):
+        """
+        Current CurrencySnapshot, for callers doing many lookups that must
+        agree. Its instances are shared: treat them as read-only.
+        """
+        return self._current()
+
+    def get(self, pk):
+        """Currency by id, or None"""
+        return copy.copy(self._current().by_id.get(pk))
+
+    def by_code(self, code, active_only=False):
+        """Currency by ISO code (any case), or None"""
+        currency = self._current().by_code.get((code or '').strip().upper())
+        if currency is not None and active_only and not currency.is_active:
+            return None
+        return copy.copy(currency)
+
+    def by_symbol(self, symbol):
+        """Currencies using a symbol"""
+        return [copy.copy(currency) for currency in self._current().by_symbol.get(symbol, [])]
+
+    def default(self):
+        """The default currency, or None"""
+        return copy.copy(self._current().default)
+
+    def active(self):
+        """Active currencies ordered by code"""
+        return [copy.copy(currency) for currency in self._current().active]
+
+    def changed(self):
+        """
+        Invalidate after currencies were written: every process rebuilds once
+        the change commits, this thread reads through until then.
+        """
+        if transaction.get_connection().in_atomic_block:
+            self._local.uncommitted = True
+            transaction.on_commit(lambda: setattr(self._local, 'uncommitted', False))
+        bump_version_on_commit(VERSION_NAME)
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+        self._local.uncommitted = False
+
+
+currency_registry = CurrencyRegistry()
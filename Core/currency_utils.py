@@ -1,6 +1,22 @@
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from django.utils import timezone
+from .currencies import currency_registry
 from .models import Currency, SupportedCurrency
 
+EXCHANGE_RATE_PLACES = Decimal('0.000001')
+# Largest value Currency.exchange_rate (max_digits=15, decimal_places=6) holds
+MAX_EXCHANGE_RATE = Decimal('999999999.999999')
+# Rounding of convert_many results
+CONVERSION_ROUNDING = ROUND_HALF_UP
+
+
+class CurrencyConversionError(ValueError):
+    """Conversions naming unknown currencies or invalid amounts; `errors` maps row index to a message"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} conversion(s) failed')
+        self.errors = errors
+
 def convert_currency(amount, from_currency, to_currency):
     """
     Convert amount from one currency to another
@@ -22,6 +38,63 @@ def convert_currency(amount, from_currency, to_currency):
         amount_in_default = amount / from_currency.exchange_rate
         return amount_in_default * to_currency.exchange_rate
 
+def convert_many(conversions, places=2):
+    """
+    Convert (amount, from, to) triples in one pass. Currencies are codes or
+    Currency instances; rates come from one snapshot of the currency registry
+    and the factor of each currency pair is computed once. Amounts are
+    converted through the default currency like convert_currency, with full
+    Decimal precision, then rounded half up to `places` decimals.
+    Returns the results in order; raises CurrencyConversionError listing the
+    bad rows.
+    """
+    snapshot = currency_registry.snapshot()
+    default_currency = snapshot.default
+    quantum = Decimal(1).scaleb(-places)
+    factors = {}
+    results = []
+    errors = {}
+
+    def factor(from_code, to_code):
+        """Units of to_code per unit of from_code, None for unknown currencies"""
+        key = (from_code, to_code)
+        if key not in factors:
+            source, target = snapshot.by_code.get(from_code), snapshot.by_code.get(to_code)
+            if source is None or target is None or not source.exchange_rate or not target.exchange_rate:
+                factors[key] = None
+            elif source == target:
+                factors[key] = Decimal(1)
+            else:
+                # The default currency is the base, its own rate is 1 by definition
+                per_default_source = Decimal(1) if source == default_currency else source.exchange_rate
+                per_default_target = Decimal(1) if target == default_currency else target.exchange_rate
+                factors[key] = per_default_target / per_default_source
+        return factors[key]
+
+    for index, (amount, from_currency, to_currency) in enumerate(conversions):
+        from_code = str(getattr(from_currency, 'code', from_currency) or '').strip().upper()
+        to_code = str(getattr(to_currency, 'code', to_currency) or '').strip().upper()
+        try:
+            amount = amount if isinstance(amount, Decimal) else Decimal(str(amount).strip())
+            if not amount.is_finite():
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            errors[index] = f'Invalid amount {amount!r}'
+            continue
+        rate = factor(from_code, to_code)
+        if rate is None:
+            errors[index] = f'Unknown currency or missing rate for {from_code} to {to_code}'
+            continue
+        try:
+            results.append((amount * rate).quantize(quantum, rounding=CONVERSION_ROUNDING))
+        except ArithmeticError:
+            # InvalidOperation from quantize, Overflow from the product
+            errors[index] = f'Amount {amount} is too large'
+    if errors:
+        raise CurrencyConversionError(errors)
+    return results
+
+
 def format_currency_amount(amount, currency):
     """
     Format amount with currency symbol
@@ -34,7 +107,7 @@ def get_currency_choices():
     """
     Get currency choices for forms
     """
-    currencies = Currency.get_active_currencies()
+    currencies = currency_registry.active()
     return [(currency.id, f"{currency.code} - {currency.name}") for currency in currencies]
 
 def get_saraf_supported_currencies(saraf):
@@ -46,26 +119,42 @@ def get_saraf_supported_currencies(saraf):
         supporting_sarafs__is_active=True
     )
 
-def update_exchange_rates():
+def update_exchange_rates(rates, base_currency='AFN'):
     """
-    Update exchange rates (this would typically call an external API)
-    Placeholder for future implementation
+    Set Currency.exchange_rate (units per default currency) from fetched
+    rates given as base currency per unit, e.g. {'USD': 70.5} AFN per USD.
+    Changed rows are written with one bulk_update, skipping save() and its
+    full_clean() / default currency queries. Returns the number of updated currencies.
     """
-    # This would typically call an external API like:
-    # - Exchange Rate API
-    # - Fixer.io
-    # - Currency Layer
-    # - Open Exchange Rates
-    pass
+    default_currency = Currency.get_default_currency()
+    per_unit = {code.upper(): Decimal(str(rate)) for code, rate in rates.items()}
+    per_unit[base_currency.upper()] = Decimal('1')
+    if default_currency is None or not per_unit.get(default_currency.code):
+        return 0
+
+    default_per_unit = per_unit[default_currency.code]
+    now = timezone.now()
+    changed = []
+    for currency in Currency.objects.filter(code__in=per_unit).only('id', 'code', 'exchange_rate'):
+        try:
+            exchange_rate = (default_per_unit / per_unit[currency.code]).quantize(EXCHANGE_RATE_PLACES)
+        except (ArithmeticError, InvalidOperation):
+            continue
+        if 0 < exchange_rate <= MAX_EXCHANGE_RATE and exchange_rate != currency.exchange_rate:
+            currency.exchange_rate = exchange_rate
+            currency.updated_at = now
+            changed.append(currency)
+    if changed:
+        Currency.objects.bulk_update(changed, ['exchange_rate', 'updated_at'])
+        # bulk_update sends no post_save, so invalidate like the signal would
+        currency_registry.changed()
+    return len(changed)
 
 def get_currency_by_code(code):
     """
     Get currency by ISO code
     """
-    try:
-        return Currency.objects.get(code=code.upper(), is_active=True)
-    except Currency.DoesNotExist:
-        return None
+    return currency_registry.by_code(code, active_only=True)
 
 def get_default_currency():
     """
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from Core import rollups
+from Core.models import sendhawala
+
+
+class Command(BaseCommand):
+    help = "Fill receiver_province / exchanger_province of hawalas from their typed locations"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of hawalas updated per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        hawalas = (
+            sendhawala.objects
+            .filter(Q(receiver_province__isnull=True) | Q(exchanger_province__isnull=True))
+            .only('send_hawala_id', 'receiver_location', 'exchanger_location',
+                  'receiver_province', 'exchanger_province')
+            .order_by('send_hawala_id')
+        )
+        last_id = 0
+        updated = 0
+        unresolved = 0
+        while True:
+            chunk = list(hawalas.filter(send_hawala_id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            for hawala in chunk:
+                hawala.assign_provinces()
+                if hawala.receiver_province_id is None or hawala.exchanger_province_id is None:
+                    unresolved += 1
+            with transaction.atomic():
+                sendhawala.objects.bulk_update(chunk, ['receiver_province', 'exchanger_province'])
+            last_id = chunk[-1].send_hawala_id
+            updated += len(chunk)
+            self.stdout.write(f"Processed {updated} hawalas...")
+
+        if updated:
+            # bulk_update bypasses the rollup signals
+            rollups.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Province backfill complete. Processed: {updated}, with unknown locations: {unresolved}"
+        ))
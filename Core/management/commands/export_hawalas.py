@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from Core.exports import EXPORT_FORMATS, export_queryset, iter_export
+from Core.models import sendhawala
+
+
+class Command(BaseCommand):
+    help = "Stream send hawalas (with their receive records) as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv', dest='export_format')
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+        parser.add_argument('--from', dest='date_from', help='First creation date, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last creation date, YYYY-MM-DD')
+        parser.add_argument('--status', choices=[choice[0] for choice in sendhawala.STATUS_CHOICES])
+
+    def handle(self, *args, **options):
+        dates = {}
+        for key in ('date_from', 'date_to'):
+            if options[key]:
+                dates[key] = parse_date(options[key])
+                if dates[key] is None:
+                    raise CommandError(f"--{key[5:]} must be in YYYY-MM-DD format")
+
+        rows = export_queryset(status=options['status'], **dates)
+        chunks = iter_export(rows, options['export_format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f"Export written to {options['output']}"))
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from Core import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily hawala rollups from the sendhawala table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day to rebuild, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last day to rebuild, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        dates = {}
+        for key in ('date_from', 'date_to'):
+            if options[key]:
+                dates[key] = parse_date(options[key])
+                if dates[key] is None:
+                    raise CommandError(f"--{key[5:]} must be in YYYY-MM-DD format")
+
+        written = rollups.rebuild(**dates)
+        self.stdout.write(self.style.SUCCESS(f"Hawala rollups rebuilt. Rows written: {written}"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from Core.models import sendhawala
+from Core.name_search import index_hawalas
+
+
+class Command(BaseCommand):
+    help = "Rebuild the sender / receiver name search tokens of all hawalas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of hawalas indexed per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        hawalas = sendhawala.objects.only('send_hawala_id', 'sender_name', 'receiver_name').order_by('send_hawala_id')
+        last_id = 0
+        indexed = 0
+        while True:
+            chunk = list(hawalas.filter(send_hawala_id__gt=last_id)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic():
+                index_hawalas(chunk)
+            last_id = chunk[-1].send_hawala_id
+            indexed += len(chunk)
+            self.stdout.write(f"Indexed {indexed} hawalas...")
+        self.stdout.write(self.style.SUCCESS(f"Name index rebuilt for {indexed} hawalas"))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0045_numbersequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sendhawala',
+            index=models.Index(fields=['created_at', 'send_hawala_id'], name='sendhawala_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendhawala',
+            index=models.Index(fields=['status', 'created_at', 'send_hawala_id'], name='sendhawala_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0046_sendhawala_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HawalaNameToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('sender', 'Sender'), ('receiver', 'Receiver')], max_length=8)),
+                ('token', models.CharField(max_length=16)),
+                ('hawala', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_tokens', to='Core.sendhawala')),
+            ],
+            options={
+                'db_table': 'hawala_name_token',
+                'indexes': [models.Index(fields=['field', 'token', 'hawala'], name='hawala_name_token_lookup_idx')],
+                'unique_together': {('hawala', 'field', 'token')},
+            },
+        ),
+    ]
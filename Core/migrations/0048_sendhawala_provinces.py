@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0047_hawalanametoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendhawala',
+            name='exchanger_province',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sendhawala_exchanger_province', to='Core.province'),
+        ),
+        migrations.AddField(
+            model_name='sendhawala',
+            name='receiver_province',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sendhawala_receiver_province', to='Core.province'),
+        ),
+        migrations.AddIndex(
+            model_name='sendhawala',
+            index=models.Index(fields=['receiver_province', 'created_at', 'send_hawala_id'], name='sendhawala_rprov_created_idx'),
+        ),
+    ]
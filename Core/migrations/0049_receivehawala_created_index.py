@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0048_sendhawala_provinces'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='receivehawala',
+            index=models.Index(fields=['created_at', 'id'], name='receive_hawala_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0049_receivehawala_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HawalaDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=96, unique=True)),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=10)),
+                ('hawala_count', models.IntegerField(default=0)),
+                ('amount_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('fee_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('currency', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.currency')),
+                ('exchanger_province', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.province')),
+                ('hawala_fee_currency', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.currency')),
+                ('receiver_province', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.province')),
+            ],
+            options={
+                'db_table': 'hawala_daily_rollup',
+                'indexes': [models.Index(fields=['day', 'status'], name='hawala_rollup_day_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Cast
 from django.contrib.auth.models import User
 import uuid
 from django.contrib.auth.hashers import make_password, check_password
@@ -43,13 +44,15 @@ class Currency(models.Model):
 
     @classmethod
     def get_default_currency(cls):
-        """Get the default currency"""
-        return cls.objects.filter(is_default=True).first()
+        """Get the default currency (from the in-memory registry, see Core.currencies)"""
+        from .currencies import currency_registry
+        return currency_registry.default()
 
     @classmethod
     def get_active_currencies(cls):
-        """Get all active currencies"""
-        return cls.objects.filter(is_active=True)
+        """Get all active currencies ordered by code (from the in-memory registry, see Core.currencies)"""
+        from .currencies import currency_registry
+        return currency_registry.active()
 
 
 class Province(models.Model):
@@ -125,6 +128,76 @@ class PasswordReset(models.Model):
         return f"Password reset for {self.user.username} at {self.created_when}"
 
 
+class NumberSequence(models.Model):
+    """
+    Named counter used to hand out blocks of unique numbers (e.g. hawala numbers)
+    """
+    name = models.CharField(max_length=64, unique=True)
+    next_value = models.BigIntegerField(default=1, help_text="First number not yet reserved by any worker")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'number_sequence'
+        verbose_name = 'Number Sequence'
+        verbose_name_plural = 'Number Sequences'
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+# Places of default currency amounts, as annotated by SendHawalaQuerySet
+DEFAULT_CURRENCY_PLACES = Decimal('0.00000001')
+
+
+class SendHawalaQuerySet(models.QuerySet):
+    """Set based versions of the sendhawala default currency conversions"""
+
+    @staticmethod
+    def _in_default_currency(value, currency):
+        # Mirrors sendhawala.get_amount_in_default_currency(): no currency or the
+        # default currency keeps the value, anything else is divided by its rate
+        # (units per default currency). The value is cast first so SQLite does
+        # not divide two whole numbers as integers.
+        output_field = models.DecimalField(max_digits=30, decimal_places=8)
+        return models.Case(
+            models.When(**{f'{currency}__isnull': True}, then=models.F(value)),
+            models.When(**{f'{currency}__is_default': True}, then=models.F(value)),
+            default=models.ExpressionWrapper(
+                Cast(value, models.FloatField()) / models.F(f'{currency}__exchange_rate'),
+                output_field=output_field,
+            ),
+            output_field=output_field,
+        )
+
+    def amount_in_default_expression(self):
+        return self._in_default_currency('amount', 'currency')
+
+    def fee_in_default_expression(self):
+        return models.Case(
+            models.When(models.Q(hawala_fee__isnull=True) | models.Q(hawala_fee=0), then=models.Value(Decimal('0'))),
+            default=self._in_default_currency('hawala_fee', 'hawala_fee_currency'),
+            output_field=models.DecimalField(max_digits=30, decimal_places=8),
+        )
+
+    def with_default_currency_amounts(self):
+        """Annotate amount_in_default and fee_in_default on every row"""
+        return self.annotate(
+            amount_in_default=self.amount_in_default_expression(),
+            fee_in_default=self.fee_in_default_expression(),
+        )
+
+    def default_currency_totals(self):
+        """Count and default currency totals of amount and fee in one query"""
+        totals = self.aggregate(
+            count=models.Count('pk'),
+            amount=models.Sum(self.amount_in_default_expression()),
+            fee=models.Sum(self.fee_in_default_expression()),
+        )
+        totals['amount'] = totals['amount'] or Decimal('0')
+        totals['fee'] = totals['fee'] or Decimal('0')
+        return totals
+
+
 class sendhawala(models.Model):
 
     STATUS_CHOICES = [
@@ -141,6 +214,21 @@ class sendhawala(models.Model):
     currency = models.ForeignKey(Currency, on_delete=models.PROTECT, null=True, blank=True)
     receiver_location = models.CharField(max_length=64)
     exchanger_location = models.CharField(max_length=64)
+    # Provinces resolved from the typed locations above
+    receiver_province = models.ForeignKey(
+        Province,
+        on_delete=models.PROTECT,
+        related_name='sendhawala_receiver_province',
+        null=True,
+        blank=True,
+    )
+    exchanger_province = models.ForeignKey(
+        Province,
+        on_delete=models.PROTECT,
+        related_name='sendhawala_exchanger_province',
+        null=True,
+        blank=True,
+    )
     sender_phone = models.CharField(
         max_length=15,
         validators=[RegexValidator(r'^0\d{9}$', 'Phone must be 10 digits and start with 0')]
@@ -153,12 +241,21 @@ class sendhawala(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='finished')
 
+    objects = SendHawalaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination walks these newest first
+            models.Index(fields=['created_at', 'send_hawala_id'], name='sendhawala_created_idx'),
+            models.Index(fields=['status', 'created_at', 'send_hawala_id'], name='sendhawala_status_created_idx'),
+            models.Index(fields=['receiver_province', 'created_at', 'send_hawala_id'], name='sendhawala_rprov_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         # Auto-generate hawala_number if not provided
         if not self.hawala_number:
-            # Get the highest hawala_number and increment by 1
-            last_hawala = sendhawala.objects.aggregate(models.Max('hawala_number'))['hawala_number__max']
-            self.hawala_number = (last_hawala or 0) + 1
+            from .sequences import hawala_number_allocator
+            self.hawala_number = hawala_number_allocator.allocate()
         
         # Set default currency if not provided
         if not self.currency_id:
@@ -172,31 +269,97 @@ class sendhawala(models.Model):
             if default_currency:
                 self.hawala_fee_currency = default_currency
         
-        self.full_clean()
+        self.assign_provinces()
+        # Provinces come from the index of active provinces, no need to look them up again
+        self.full_clean(exclude=['receiver_province', 'exchanger_province'])
         super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded column values, so rollups can apply only what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def assign_provinces(self):
+        """Resolve the typed locations to provinces (in memory, see Core.provinces)"""
+        from .provinces import province_index
+        self.receiver_province = province_index.resolve(self.receiver_location)
+        self.exchanger_province = province_index.resolve(self.exchanger_location)
     
     def __str__(self):
         return f"Hawala #{self.hawala_number} - {self.sender_name} to {self.receiver_name}"
 
-    def get_amount_in_default_currency(self):
-        """Convert amount to default currency"""
-        default_currency = Currency.get_default_currency()
+    def get_amount_in_default_currency(self, default_currency=None):
+        """Convert amount to default currency (pass default_currency when converting many hawalas)"""
+        if default_currency is None:
+            default_currency = Currency.get_default_currency()
         if not self.currency:
             return self.amount
         if self.currency == default_currency:
             return self.amount
-        return self.amount * self.currency.exchange_rate
+        return (self.amount / self.currency.exchange_rate).quantize(DEFAULT_CURRENCY_PLACES)
 
-    def get_fee_in_default_currency(self):
-        """Convert fee to default currency"""
+    def get_fee_in_default_currency(self, default_currency=None):
+        """Convert fee to default currency (pass default_currency when converting many hawalas)"""
         if not self.hawala_fee:
             return 0
-        default_currency = Currency.get_default_currency()
+        if default_currency is None:
+            default_currency = Currency.get_default_currency()
         if not self.hawala_fee_currency:
             return self.hawala_fee
         if self.hawala_fee_currency == default_currency:
             return self.hawala_fee
-        return self.hawala_fee * self.hawala_fee_currency.exchange_rate
+        return (self.hawala_fee / self.hawala_fee_currency.exchange_rate).quantize(DEFAULT_CURRENCY_PLACES)
+
+
+class HawalaNameToken(models.Model):
+    """Search token of a hawala sender/receiver name (see Core.name_search)"""
+    FIELD_CHOICES = [
+        ('sender', 'Sender'),
+        ('receiver', 'Receiver'),
+    ]
+
+    hawala = models.ForeignKey('sendhawala', on_delete=models.CASCADE, related_name='name_tokens')
+    field = models.CharField(max_length=8, choices=FIELD_CHOICES)
+    token = models.CharField(max_length=16)
+
+    class Meta:
+        db_table = 'hawala_name_token'
+        unique_together = ['hawala', 'field', 'token']
+        indexes = [
+            models.Index(fields=['field', 'token', 'hawala'], name='hawala_name_token_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.hawala_id} {self.field}: {self.token}"
+
+
+class HawalaDailyRollup(models.Model):
+    """
+    Daily hawala totals per currency, route and status (see Core.rollups).
+    Kept up to date incrementally as hawalas are created, changed and deleted.
+    """
+    # day|currency|fee currency|receiver province|exchanger province|status
+    key = models.CharField(max_length=96, unique=True)
+    day = models.DateField()
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, null=True, related_name='+')
+    hawala_fee_currency = models.ForeignKey(Currency, on_delete=models.CASCADE, null=True, related_name='+')
+    receiver_province = models.ForeignKey(Province, on_delete=models.CASCADE, null=True, related_name='+')
+    exchanger_province = models.ForeignKey(Province, on_delete=models.CASCADE, null=True, related_name='+')
+    status = models.CharField(max_length=10)
+    hawala_count = models.IntegerField(default=0)
+    amount_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    fee_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'hawala_daily_rollup'
+        indexes = [
+            models.Index(fields=['day', 'status'], name='hawala_rollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.hawala_count}"
 
 
 class ReceiveHawala(models.Model):
@@ -280,6 +443,9 @@ class ReceiveHawala(models.Model):
         db_table = 'core_receive_hawala'
         verbose_name = 'Receive Hawala'
         verbose_name_plural = 'Receive Hawalas'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='receive_hawala_created_idx'),
+        ]
     
     def __str__(self):
         return f"Receive Hawala #{self.hawala_number} - {self.receiver_name}"
@@ -1018,7 +1184,10 @@ class normal_user_Profile(models.Model):
 
     def get_preferred_currency(self):
         """Get user's preferred currency or default currency"""
-        return self.preferred_currency or Currency.get_default_currency()
+        from .currencies import currency_registry
+        if self.preferred_currency_id:
+            return currency_registry.get(self.preferred_currency_id) or self.preferred_currency
+        return currency_registry.default()
 
     def set_password(self, raw_password):
         """
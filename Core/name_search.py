@@ -0,0 +1,154 @@
+"""
+Token index for searching hawala sender / receiver names.
+
+Names are normalized (case folded, diacritics removed, Arabic / Pashto letter
+variants folded onto their Dari forms) and stored as tokens in the
+HawalaNameToken side table:
+
+- ``p:<prefix>``  prefixes of every normalized word
+- ``k:<prefix>``  prefixes of a script independent consonant key, so that
+                  "Ahmad", "Ahmed" and "احمد" all share the key ``hmd``
+- ``t:<gram>``    trigrams of every normalized word, for matches inside a word
+
+A lookup is a handful of equality probes on the (field, token) index instead of
+an ``icontains`` scan over the whole hawala table.
+"""
+import re
+import unicodedata
+
+from django.db.models import Count, Q
+
+from .models import HawalaNameToken
+
+PREFIX_LENGTH = 10
+KEY_LENGTH = 8
+MIN_KEY_LENGTH = 2
+
+# Arabic and Pashto letters folded onto the Dari letter a clerk would type
+LETTER_FOLDING = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ې': 'ی', 'ۍ': 'ی',
+    'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'ټ': 'ت', 'ډ': 'د', 'ړ': 'ر', 'ڼ': 'ن',
+    'ښ': 'ش', 'ږ': 'ژ', 'ځ': 'ز', 'څ': 'س',
+    '\u0640': None, '\u200c': None, '\u200d': None,  # tatweel, ZWNJ, ZWJ
+    '۰': '0', '۱': '1', '۲': '2', '۳': '3', '۴': '4',
+    '۵': '5', '۶': '6', '۷': '7', '۸': '8', '۹': '9',
+})
+
+# Consonant key shared by both scripts. Vowels and the letters that usually
+# stand for vowels (ا و ی ع / a e i o u w v y) are dropped.
+ARABIC_KEY = {
+    'ب': 'b', 'پ': 'p', 'ت': 't', 'ط': 't', 'ث': 's', 'س': 's', 'ص': 's',
+    'ج': 'j', 'ژ': 'j', 'چ': 'c', 'ح': 'h', 'ه': 'h', 'خ': 'x',
+    'د': 'd', 'ذ': 'z', 'ز': 'z', 'ض': 'z', 'ظ': 'z', 'ر': 'r',
+    'ش': 'w', 'غ': 'q', 'ق': 'q', 'ف': 'f', 'ک': 'k', 'گ': 'g',
+    'ل': 'l', 'م': 'm', 'ن': 'n',
+}
+LATIN_DIGRAPHS = [('kh', 'x'), ('gh', 'q'), ('sh', 'w'), ('ch', 'c'), ('zh', 'j'),
+                  ('th', 't'), ('dh', 'z'), ('ph', 'f'), ('ck', 'k')]
+LATIN_KEY = {
+    'b': 'b', 'p': 'p', 't': 't', 's': 's', 'j': 'j', 'h': 'h', 'd': 'd',
+    'z': 'z', 'r': 'r', 'f': 'f', 'q': 'q', 'k': 'k', 'c': 'k', 'g': 'g',
+    'l': 'l', 'm': 'm', 'n': 'n', 'x': 'ks',
+}
+VOWELS = set('aeiouwvy')
+WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Case fold, strip diacritics and fold letter variants"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return text.translate(LETTER_FOLDING).casefold()
+
+
+def words(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def consonant_key(word):
+    """Script independent consonant skeleton of a normalized word"""
+    if any('\u0600' <= ch <= '\u06ff' for ch in word):
+        if len(word) > 1 and word.endswith('ه'):
+            word = word[:-1]
+        symbols = [ARABIC_KEY.get(ch, '') for ch in word]
+    else:
+        if len(word) > 1 and word.endswith('h') and word[-2] in VOWELS:
+            word = word[:-1]
+        # Digraph symbols are marked upper case so they survive the vowel filter
+        for digraph, symbol in LATIN_DIGRAPHS:
+            word = word.replace(digraph, symbol.upper())
+        symbols = [ch.lower() if ch.isupper() else ('' if ch in VOWELS else LATIN_KEY.get(ch, ''))
+                   for ch in word]
+    key = []
+    for symbol in ''.join(symbols):
+        if not key or key[-1] != symbol:
+            key.append(symbol)
+    return ''.join(key)
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def name_tokens(name):
+    """All index tokens for a name"""
+    tokens = set()
+    for word in words(name):
+        for length in range(1, min(len(word), PREFIX_LENGTH) + 1):
+            tokens.add(f'p:{word[:length]}')
+        key = consonant_key(word)
+        for length in range(MIN_KEY_LENGTH, min(len(key), KEY_LENGTH) + 1):
+            tokens.add(f'k:{key[:length]}')
+        tokens.update(f't:{gram}' for gram in trigrams(word))
+    return tokens
+
+
+def build_tokens(hawala):
+    """Unsaved HawalaNameToken rows for a hawala"""
+    return [
+        HawalaNameToken(hawala_id=hawala.pk, field=field, token=token)
+        for field, name in (('sender', hawala.sender_name), ('receiver', hawala.receiver_name))
+        for token in sorted(name_tokens(name))
+    ]
+
+
+def index_hawalas(hawalas):
+    """(Re)build the name tokens of saved hawalas"""
+    hawalas = [h for h in hawalas if h.pk]
+    if not hawalas:
+        return
+    HawalaNameToken.objects.filter(hawala_id__in=[h.pk for h in hawalas]).delete()
+    HawalaNameToken.objects.bulk_create(
+        [token for hawala in hawalas for token in build_tokens(hawala)],
+        batch_size=1000,
+    )
+
+
+def name_query(field, text, hawala_ref='pk'):
+    """
+    Q object matching hawalas whose `field` ('sender' or 'receiver') matches
+    every word of `text` by prefix, consonant key or trigrams.
+    `hawala_ref` is the lookup pointing at the sendhawala primary key.
+    """
+    query = Q()
+    tokens = HawalaNameToken.objects.filter(field=field)
+    for word in words(text):
+        probes = [f'p:{word[:PREFIX_LENGTH]}']
+        key = consonant_key(word)
+        if len(key) >= MIN_KEY_LENGTH:
+            probes.append(f'k:{key[:KEY_LENGTH]}')
+        word_query = Q(**{f'{hawala_ref}__in': tokens.filter(token__in=probes).values('hawala_id')})
+
+        grams = trigrams(word)
+        if grams:
+            containing = (
+                tokens.filter(token__in=[f't:{gram}' for gram in grams])
+                .values('hawala_id')
+                .annotate(matched=Count('token', distinct=True))
+                .filter(matched=len(grams))
+                .values('hawala_id')
+            )
+            word_query |= Q(**{f'{hawala_ref}__in': containing})
+        query &= word_query
+    return query
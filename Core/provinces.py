@@ -0,0 +1,110 @@
+"""
+Process-wide index of province names.
+
+Resolves the free-text locations typed on a hawala (English or Dari names,
+common alternate spellings) to Province rows without a database query. The
+index is rebuilt whenever the shared 'provinces' version is bumped.
+"""
+import re
+import threading
+
+from .cache_utils import get_version
+from .models import Province
+from .name_search import normalize
+
+VERSION_NAME = 'provinces'
+
+# Dari names and alternate spellings of the seeded provinces
+PROVINCE_ALIASES = {
+    'Badakhshan': ['بدخشان', 'Badakshan'],
+    'Badghis': ['بادغیس', 'Badghes'],
+    'Baghlan': ['بغلان'],
+    'Balkh': ['بلخ', 'Mazar', 'Mazar-i-Sharif', 'Mazar-e Sharif', 'مزار شریف'],
+    'Bamyan': ['بامیان', 'Bamiyan', 'Bamian'],
+    'Daykundi': ['دایکندی', 'Daikundi', 'Daykondi'],
+    'Farah': ['فراه'],
+    'Faryab': ['فاریاب'],
+    'Ghazni': ['غزنی'],
+    'Ghor': ['غور', 'Ghowr'],
+    'Helmand': ['هلمند', 'Hilmand'],
+    'Herat': ['هرات', 'Hirat'],
+    'Jowzjan': ['جوزجان', 'Jawzjan', 'Jozjan'],
+    'Kabul': ['کابل'],
+    'Kandahar': ['کندهار', 'قندهار', 'Qandahar'],
+    'Kapisa': ['کاپیسا'],
+    'Khost': ['خوست', 'Khowst'],
+    'Kunar': ['کنر', 'Konar'],
+    'Kunduz': ['کندز', 'Kondoz', 'Qunduz'],
+    'Laghman': ['لغمان'],
+    'Logar': ['لوگر', 'Lowgar'],
+    'Nangarhar': ['ننگرهار', 'Jalalabad'],
+    'Nimruz': ['نیمروز', 'Nimroz'],
+    'Nuristan': ['نورستان', 'Nooristan'],
+    'Paktia': ['پکتیا', 'Paktiya'],
+    'Paktika': ['پکتیکا'],
+    'Panjshir': ['پنجشیر', 'Panjsher'],
+    'Parwan': ['پروان', 'Parvan'],
+    'Samangan': ['سمنگان'],
+    'Sar-e Pol': ['سرپل', 'Sar-i-Pul', 'Sari Pul', 'Sar-e-Pul'],
+    'Takhar': ['تخار'],
+    'Uruzgan': ['ارزگان', 'Oruzgan', 'Urozgan'],
+    'Wardak': ['وردک', 'Maidan Wardak', 'میدان وردک'],
+    'Zabul': ['زابل'],
+}
+
+SEPARATORS_RE = re.compile(r'[\W_]+')
+
+
+def province_key(name):
+    """Lookup key of a province name: normalized, without spaces or dashes"""
+    return SEPARATORS_RE.sub('', normalize(name))
+
+
+class ProvinceIndex:
+    """Active provinces by id and by name / alias key"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._by_id = {}
+        self._by_key = {}
+
+    def _current(self):
+        version = get_version(VERSION_NAME)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._rebuild(version)
+        return self._by_id, self._by_key
+
+    def _rebuild(self, version):
+        by_id = {}
+        by_key = {}
+        for province in Province.objects.filter(is_active=True).only('id', 'name'):
+            by_id[province.id] = province
+            by_key[province_key(province.name)] = province
+        for name, aliases in PROVINCE_ALIASES.items():
+            province = by_key.get(province_key(name))
+            if province:
+                for alias in aliases:
+                    # A real province name always wins over an alias
+                    by_key.setdefault(province_key(alias), province)
+        self._by_id, self._by_key = by_id, by_key
+        self._version = version
+
+    def resolve(self, name):
+        """Active Province for a typed location, or None"""
+        if not name:
+            return None
+        return self._current()[1].get(province_key(name))
+
+    def get(self, pk):
+        """Active Province by id, or None"""
+        return self._current()[0].get(pk)
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+
+
+province_index = ProvinceIndex()
@@ -0,0 +1,79 @@
+"""
+Process-wide index of the effective exchange rates sarafs quote.
+
+For every (currency, province) pair, and for (currency, None) covering all
+provinces, the index holds the active sarafs supporting the currency sorted
+by their effective rate (SupportedCurrency.get_effective_rate: the custom
+rate, else the currency's exchange rate), highest first. A best-quote lookup
+is a dict read and a slice. The index is rebuilt when the 'quotes' version
+(supported currencies, sarafs and their provinces) or the 'currencies'
+version (base exchange rates) is bumped.
+"""
+import threading
+
+from .cache_utils import get_version
+from .models import SarafProfile, SupportedCurrency
+
+VERSION_NAME = 'quotes'
+CURRENCIES_VERSION = 'currencies'
+
+
+class QuoteIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._quotes = {}
+
+    def _current(self):
+        version = (get_version(VERSION_NAME), get_version(CURRENCIES_VERSION))
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._rebuild(version)
+        return self._quotes
+
+    def _rebuild(self, version):
+        provinces = {}
+        for saraf_id, province_id in SarafProfile.provinces.through.objects.values_list(
+            'sarafprofile_id', 'province_id'
+        ):
+            provinces.setdefault(saraf_id, []).append(province_id)
+
+        quotes = {}
+        supported = SupportedCurrency.objects.filter(
+            is_active=True, saraf__is_active=True, currency__is_active=True
+        ).values_list(
+            'currency_id', 'saraf_id', 'custom_rate', 'currency__exchange_rate',
+            'saraf__name', 'saraf__last_name', 'saraf__exchange_name',
+        )
+        for currency_id, saraf_id, custom_rate, exchange_rate, name, last_name, exchange_name in supported:
+            quote = {
+                'saraf_id': saraf_id,
+                'name': f"{name} {last_name}".strip(),
+                'exchange_name': exchange_name,
+                'rate': custom_rate if custom_rate else exchange_rate,
+                'is_custom_rate': bool(custom_rate),
+            }
+            for province_id in [None] + provinces.get(saraf_id, []):
+                quotes.setdefault((currency_id, province_id), []).append(quote)
+        for entries in quotes.values():
+            entries.sort(key=lambda quote: (-quote['rate'], quote['saraf_id']))
+        self._quotes = quotes
+        self._version = version
+
+    def best(self, currency_id, province_id=None, limit=5, highest=True):
+        """
+        Top `limit` quotes for a currency (in a province), highest rate first
+        or, with highest=False, lowest first. Quotes are shared dicts: do not modify.
+        """
+        entries = self._current().get((currency_id, province_id), [])
+        if highest:
+            return entries[:limit]
+        return list(reversed(entries[-limit:]))
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+
+
+quote_index = QuoteIndex()
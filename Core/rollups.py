@@ -0,0 +1,207 @@
+"""
+Incremental daily rollups of send hawalas.
+
+Every hawala counts towards one HawalaDailyRollup bucket: its creation day
+(local time) x currency x fee currency x receiver / exchanger province x
+status. Creating, changing, moving or deleting hawalas applies +/- deltas to
+the affected buckets with F() updates, so dashboards read the small rollup
+table instead of aggregating sendhawala.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import HawalaDailyRollup, sendhawala
+
+# Bucket dimensions after the day, as sendhawala attribute names
+DIMENSIONS = ['currency_id', 'hawala_fee_currency_id', 'receiver_province_id', 'exchanger_province_id', 'status']
+ROLLUP_FIELDS = ['created_at', 'amount', 'hawala_fee'] + DIMENSIONS
+
+
+def _day(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def bucket_key(bucket):
+    return '|'.join('' if part is None else str(part) for part in bucket)
+
+
+def _contribution(values):
+    """(bucket, amount, fee) of a hawala given its column values"""
+    bucket = (_day(values['created_at']),) + tuple(values[name] for name in DIMENSIONS)
+    return bucket, values['amount'] or Decimal('0'), values['hawala_fee'] or Decimal('0')
+
+
+def _current_values(hawala):
+    return {name: getattr(hawala, name) for name in ROLLUP_FIELDS}
+
+
+def _loaded_values(hawala):
+    loaded = getattr(hawala, '_loaded_values', None)
+    if loaded is None:
+        return None
+    return {name: loaded[name] if name in loaded else getattr(hawala, name) for name in ROLLUP_FIELDS}
+
+
+def apply_deltas(deltas):
+    """Add {bucket: [count, amount, fee]} to the rollup rows"""
+    # A fixed order keeps concurrent writers from deadlocking on the rows
+    for bucket, (count, amount, fee) in sorted(deltas.items(), key=lambda item: bucket_key(item[0])):
+        if not (count or amount or fee):
+            continue
+        key = bucket_key(bucket)
+        rollup = HawalaDailyRollup.objects.filter(key=key)
+        increment = dict(hawala_count=F('hawala_count') + count, amount_sum=F('amount_sum') + amount,
+                         fee_sum=F('fee_sum') + fee)
+        if rollup.update(**increment):
+            continue
+        day, currency_id, fee_currency_id, receiver_province_id, exchanger_province_id, status = bucket
+        try:
+            with transaction.atomic():
+                HawalaDailyRollup.objects.create(
+                    key=key, day=day, currency_id=currency_id, hawala_fee_currency_id=fee_currency_id,
+                    receiver_province_id=receiver_province_id, exchanger_province_id=exchanger_province_id,
+                    status=status, hawala_count=count, amount_sum=amount, fee_sum=fee,
+                )
+        except IntegrityError:
+            # Another writer created the row first
+            rollup.update(**increment)
+
+
+def _add(deltas, values, sign):
+    bucket, amount, fee = _contribution(values)
+    delta = deltas[bucket]
+    delta[0] += sign
+    delta[1] += sign * amount
+    delta[2] += sign * fee
+
+
+def record_created(hawalas):
+    """Count newly created hawalas"""
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for hawala in hawalas:
+        _add(deltas, _current_values(hawala), 1)
+        hawala._loaded_values = _current_values(hawala)
+    apply_deltas(deltas)
+
+
+def record_saved(hawala, update_fields=None):
+    """Move a saved hawala's contribution if any rolled up value changed"""
+    before = _loaded_values(hawala)
+    after = _current_values(hawala)
+    if before is None:
+        # Not loaded from the database, nothing to compare with
+        return
+    if update_fields is not None:
+        # Columns left out of update_fields kept their stored value
+        written = {hawala._meta.get_field(name).attname for name in update_fields}
+        after = {name: after[name] if name in written else before[name] for name in ROLLUP_FIELDS}
+    if before != after:
+        deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+        _add(deltas, before, -1)
+        _add(deltas, after, 1)
+        apply_deltas(deltas)
+    hawala._loaded_values = after
+
+
+def record_deleted(hawala):
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    _add(deltas, _loaded_values(hawala) or _current_values(hawala), -1)
+    apply_deltas(deltas)
+
+
+def record_status_change(hawala_ids, from_status, to_status):
+    """Move hawalas that changed status with a conditional UPDATE (Core.transitions)"""
+    deltas = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for group in _aggregate(sendhawala.objects.filter(pk__in=hawala_ids)):
+        count, amount, fee = group['count'], group['amount'] or Decimal('0'), group['fee'] or Decimal('0')
+        for status, sign in ((from_status, -1), (to_status, 1)):
+            bucket = (group['day'],) + tuple(group[name] for name in DIMENSIONS[:-1]) + (status,)
+            delta = deltas[bucket]
+            delta[0] += sign * count
+            delta[1] += sign * amount
+            delta[2] += sign * fee
+    apply_deltas(deltas)
+
+
+def _aggregate(hawalas):
+    """Per-bucket count and sums of a sendhawala queryset"""
+    return (
+        hawalas.annotate(day=TruncDate('created_at'))
+        .values('day', *DIMENSIONS)
+        .annotate(count=Count('pk'), amount=Sum('amount'), fee=Sum('hawala_fee'))
+        .order_by()
+    )
+
+
+def rebuild(date_from=None, date_to=None):
+    """Recompute the rollups (of a date range) from sendhawala; returns the number of rows written"""
+    hawalas = sendhawala.objects.all()
+    rollups = HawalaDailyRollup.objects.all()
+    if date_from:
+        hawalas = hawalas.filter(created_at__date__gte=date_from)
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        hawalas = hawalas.filter(created_at__date__lte=date_to)
+        rollups = rollups.filter(day__lte=date_to)
+
+    rows = []
+    for group in _aggregate(hawalas):
+        bucket = (group['day'],) + tuple(group[name] for name in DIMENSIONS)
+        rows.append(HawalaDailyRollup(
+            key=bucket_key(bucket), day=group['day'], currency_id=group['currency_id'],
+            hawala_fee_currency_id=group['hawala_fee_currency_id'],
+            receiver_province_id=group['receiver_province_id'],
+            exchanger_province_id=group['exchanger_province_id'], status=group['status'],
+            hawala_count=group['count'], amount_sum=group['amount'] or 0, fee_sum=group['fee'] or 0,
+        ))
+    with transaction.atomic():
+        rollups.delete()
+        HawalaDailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+# Dashboard grouping name -> rollup columns returned for it
+GROUPINGS = {
+    'day': ['day'],
+    'currency': ['currency_id', 'currency__code'],
+    'fee_currency': ['hawala_fee_currency_id', 'hawala_fee_currency__code'],
+    'receiver_province': ['receiver_province_id', 'receiver_province__name'],
+    'exchanger_province': ['exchanger_province_id', 'exchanger_province__name'],
+    'status': ['status'],
+}
+
+
+# Amounts only add up within one currency and fees within one fee currency,
+# so every grouping is split by both
+SUMMED_PER = ['currency', 'fee_currency']
+
+
+def grouping(group_by):
+    """The GROUPINGS names totals() groups by for a requested grouping"""
+    return list(group_by) + [name for name in SUMMED_PER if name not in group_by]
+
+
+def totals(group_by, date_from=None, date_to=None, status=None):
+    """
+    Hawala count, amount and fee sums from the rollups, grouped by GROUPINGS
+    names plus the currency and fee currency (see grouping())
+    """
+    rollups = HawalaDailyRollup.objects.all()
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+    if status:
+        rollups = rollups.filter(status=status)
+    columns = [column for name in grouping(group_by) for column in GROUPINGS[name]]
+    return (
+        rollups.values(*columns)
+        .annotate(hawala_count=Sum('hawala_count'), amount_sum=Sum('amount_sum'), fee_sum=Sum('fee_sum'))
+        .filter(hawala_count__gt=0)
+        .order_by(*columns)
+    )
@@ -0,0 +1,97 @@
+"""
+Block based number allocation backed by the NumberSequence table.
+
+Every worker process reserves a block of numbers with one atomic UPDATE on the
+sequence row and then hands them out from memory. Creating a hawala therefore
+no longer runs MAX(hawala_number) and concurrent workers never race for the
+same number.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+
+from .models import NumberSequence
+
+
+class BlockAllocator:
+    """Hand out unique numbers from blocks reserved on a NumberSequence row"""
+
+    def __init__(self, name, seed=None, block_size=None):
+        self.name = name
+        # Callable returning the first value of a sequence that does not exist yet
+        self.seed = seed
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        # Committed, unused (start, end) ranges owned by this process; end is exclusive
+        self._blocks = []
+
+    @property
+    def block_size(self):
+        return self._block_size or getattr(settings, 'NUMBER_SEQUENCE_BLOCK_SIZE', 50)
+
+    def allocate(self):
+        """Return a single unused number"""
+        return self.allocate_block(1).start
+
+    def allocate_block(self, count):
+        """Return a range of `count` contiguous unused numbers"""
+        if count < 1:
+            raise ValueError("count must be at least 1")
+
+        with self._lock:
+            for index, (start, end) in enumerate(self._blocks):
+                if end - start >= count:
+                    if end - start == count:
+                        del self._blocks[index]
+                    else:
+                        self._blocks[index] = (start + count, end)
+                    return range(start, start + count)
+
+        size = max(count, self.block_size)
+        start = self._reserve(size)
+        if size > count:
+            # The rest of the block only becomes usable once the reservation is
+            # committed. If the surrounding transaction rolls back, the sequence
+            # row is restored and the leftover numbers are simply never handed out.
+            leftover = (start + count, start + size)
+            transaction.on_commit(lambda: self._release(*leftover))
+        return range(start, start + count)
+
+    def reset(self):
+        """Forget all blocks held by this process"""
+        with self._lock:
+            self._blocks = []
+
+    def _release(self, start, end):
+        with self._lock:
+            self._blocks.append((start, end))
+
+    def _reserve(self, size):
+        """Atomically move the sequence forward by `size` and return the first reserved number"""
+        sequence = NumberSequence.objects.filter(name=self.name)
+        with transaction.atomic():
+            if not sequence.update(next_value=models.F('next_value') + size):
+                self._create_sequence()
+                sequence.update(next_value=models.F('next_value') + size)
+            # The UPDATE above holds the row lock until commit, so this read sees our own increment
+            next_value = sequence.values_list('next_value', flat=True).get()
+        return next_value - size
+
+    def _create_sequence(self):
+        first_value = self.seed() if self.seed else 1
+        try:
+            with transaction.atomic():
+                NumberSequence.objects.create(name=self.name, next_value=first_value)
+        except IntegrityError:
+            # Another worker created the row first
+            pass
+
+
+def _first_hawala_number():
+    from .models import sendhawala
+    last_hawala = sendhawala.objects.aggregate(models.Max('hawala_number'))['hawala_number__max']
+    return (last_hawala or 0) + 1
+
+
+hawala_number_allocator = BlockAllocator('sendhawala.hawala_number', seed=_first_hawala_number)
@@ -1,6 +1,19 @@
-from django.dispatch import receiver
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import Signal, receiver
 from allauth.account.signals import user_signed_up
 
+from .cache_utils import bump_version_on_commit
+from .catalogue import UNLISTED_FIELDS, VERSION_NAME as CATALOGUE_VERSION
+from .currencies import currency_registry
+from .models import Currency, Province, SarafProfile, SupportedCurrency, sendhawala
+from .name_search import index_hawalas
+from . import rollups
+
+# Sent by Core.transitions after hawalas moved between statuses with a
+# conditional UPDATE (no post_save is sent for those).
+# Arguments: hawala_ids, from_status, to_status
+hawala_status_changed = Signal()
+
 @receiver(user_signed_up)
 def handle_user_signed_up(request, sociallogin, user, **kwargs):
 
@@ -9,4 +22,63 @@ def handle_user_signed_up(request, sociallogin, user, **kwargs):
 
     print(new_user_data)
 
-    # perform tasks/processing on data
\ No newline at end of file
+    # perform tasks/processing on data
+
+@receiver(post_save, sender=sendhawala)
+def index_hawala_names(sender, instance, update_fields=None, **kwargs):
+    """Keep the sender / receiver name search tokens in step with the hawala"""
+    if update_fields is not None and not {'sender_name', 'receiver_name'} & set(update_fields):
+        return
+    index_hawalas([instance])
+
+
+@receiver(post_save, sender=Province)
+@receiver(post_delete, sender=Province)
+def invalidate_province_index(sender, **kwargs):
+    bump_version_on_commit('provinces')
+
+
+@receiver(post_save, sender=Currency)
+@receiver(post_delete, sender=Currency)
+def invalidate_currencies(sender, update_fields=None, **kwargs):
+    currency_registry.changed()
+    if update_fields is None or set(update_fields) - UNLISTED_FIELDS:
+        bump_version_on_commit(CATALOGUE_VERSION)
+
+
+# SarafProfile fields the quote index reads
+QUOTED_SARAF_FIELDS = {'is_active', 'name', 'last_name', 'exchange_name'}
+
+
+@receiver(post_save, sender=SupportedCurrency)
+@receiver(post_delete, sender=SupportedCurrency)
+@receiver(post_delete, sender=SarafProfile)
+@receiver(m2m_changed, sender=SarafProfile.provinces.through)
+def invalidate_quote_index(sender, **kwargs):
+    bump_version_on_commit('quotes')
+
+
+@receiver(post_save, sender=SarafProfile)
+def invalidate_quote_index_on_saraf_save(sender, update_fields=None, **kwargs):
+    """Logo, photo and password saves name their update_fields and leave the quotes alone"""
+    if update_fields is not None and not QUOTED_SARAF_FIELDS & set(update_fields):
+        return
+    bump_version_on_commit('quotes')
+
+
+@receiver(post_save, sender=sendhawala)
+def update_hawala_rollups(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        rollups.record_created([instance])
+    else:
+        rollups.record_saved(instance, update_fields=update_fields)
+
+
+@receiver(post_delete, sender=sendhawala)
+def remove_hawala_from_rollups(sender, instance, **kwargs):
+    rollups.record_deleted(instance)
+
+
+@receiver(hawala_status_changed)
+def move_hawalas_between_rollups(sender, hawala_ids, from_status, to_status, **kwargs):
+    rollups.record_status_change(hawala_ids, from_status, to_status)
@@ -1,14 +1,31 @@
+import os
 from decimal import Decimal
+from unittest import mock
 
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from .models import (
     Currency,
+    HawalaDailyRollup,
+    NumberSequence,
     SupportedCurrency,
     SarafProfile,
     sendhawala,
 )
+from . import rollups
+from .checks import check_shared_cache
+from .currencies import currency_registry
+from .provinces import province_index
+from .signals import hawala_status_changed
+from .sequences import hawala_number_allocator
+from .transitions import (
+    InvalidTransition,
+    TransitionConflict,
+    bulk_transition,
+    bulk_transition_ids,
+    transition_hawala,
+)
 
 
 class CoreModelsTestCase(TestCase):
@@ -76,7 +93,7 @@ class CoreModelsTestCase(TestCase):
             sender_phone="+15550000001",
         )
 
-        self.assertEqual(tx.get_amount_in_default_currency(), Decimal("120.00"))
+        self.assertEqual(tx.get_amount_in_default_currency(), Decimal("83.33333333"))
 
         # If transaction is already in default currency, amount should be unchanged
         tx2 = sendhawala.objects.create(
@@ -148,3 +165,187 @@ class CoreModelsTestCase(TestCase):
             ["EUR"],
             transform=list,
         )
+
+
+class HawalaTestMixin:
+    def setUp(self):
+        hawala_number_allocator.reset()
+        province_index.clear()
+        currency_registry.clear()
+
+    def _create_hawala(self, **kwargs):
+        data = dict(
+            sender_name="Sender",
+            receiver_name="Receiver",
+            amount=Decimal("100.00"),
+            receiver_location="Kabul",
+            exchanger_location="Herat",
+            sender_phone="0700000001",
+        )
+        data.update(kwargs)
+        return sendhawala.objects.create(**data)
+
+
+class HawalaNumberAllocatorTestCase(HawalaTestMixin, TestCase):
+
+    def test_numbers_continue_after_existing_hawalas(self):
+        """
+        The first allocation seeds the sequence from the highest existing hawala_number.
+        """
+        self._create_hawala(hawala_number=500)
+        first = self._create_hawala()
+        second = self._create_hawala()
+
+        self.assertEqual(first.hawala_number, 501)
+        self.assertGreater(second.hawala_number, first.hawala_number)
+        self.assertEqual(NumberSequence.objects.count(), 1)
+
+    def test_reserved_block_is_served_from_memory_after_commit(self):
+        """
+        Once a reservation commits, the rest of the block is handed out without touching the database.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            first = hawala_number_allocator.allocate()
+
+        with self.assertNumQueries(0):
+            numbers = [hawala_number_allocator.allocate() for _ in range(5)]
+
+        self.assertEqual(numbers, list(range(first + 1, first + 6)))
+        block = hawala_number_allocator.allocate_block(3)
+        self.assertEqual(list(block), [first + 6, first + 7, first + 8])
+
+
+class HawalaStatusTransitionTestCase(HawalaTestMixin, TestCase):
+    def test_transition_is_conditional_on_current_status(self):
+        """
+        A legal move updates the row and reports where it came from; moving a finished hawala is a conflict.
+        """
+        hawala = self._create_hawala(status='started')
+        received = []
+        hawala_status_changed.connect(lambda **kwargs: received.append(kwargs), weak=False,
+                                      dispatch_uid='test-transition')
+        self.addCleanup(hawala_status_changed.disconnect, dispatch_uid='test-transition')
+
+        self.assertEqual(transition_hawala(hawala.pk, 'finished'), 'started')
+        self.assertEqual(sendhawala.objects.get(pk=hawala.pk).status, 'finished')
+        self.assertEqual(received[0]['hawala_ids'], [hawala.pk])
+
+        with self.assertRaises(TransitionConflict) as conflict:
+            transition_hawala(hawala.pk, 'snoozed')
+        self.assertEqual(conflict.exception.current_status, 'finished')
+        with self.assertRaises(InvalidTransition):
+            transition_hawala(hawala.pk, 'snoozed', expected='finished')
+
+    def test_bulk_transition_reports_conflicts_and_missing_rows(self):
+        started = self._create_hawala(status='started')
+        snoozed = self._create_hawala(status='snoozed')
+        finished = self._create_hawala(status='finished')
+
+        result = bulk_transition_ids([started.pk, snoozed.pk, finished.pk, 999999], 'started')
+
+        self.assertEqual(result.moved, {snoozed.pk: 'snoozed'})
+        self.assertEqual(result.conflicts, {finished.pk: 'finished'})
+        self.assertEqual(result.not_found, [999999])
+        self.assertEqual(sendhawala.objects.get(pk=snoozed.pk).status, 'started')
+
+
+class HawalaRollupTestCase(HawalaTestMixin, TestCase):
+    def _rollup_rows(self):
+        return sorted(
+            HawalaDailyRollup.objects.filter(hawala_count__gt=0)
+            .values_list('key', 'hawala_count', 'amount_sum', 'fee_sum')
+        )
+
+    def test_incremental_rollups_match_a_rebuild(self):
+        """
+        Creating, editing, moving and deleting hawalas keeps the rollups equal to a full recomputation.
+        """
+        usd = Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_default=True)
+        first = self._create_hawala(status='started', currency=usd, hawala_fee=Decimal("2.50"))
+        second = self._create_hawala(status='started', currency=usd, amount=Decimal("40.00"))
+        third = self._create_hawala(status='snoozed', currency=usd)
+
+        second = sendhawala.objects.get(pk=second.pk)
+        second.amount = Decimal("60.00")
+        second.save()
+        bulk_transition(sendhawala.objects.filter(pk__in=[first.pk, third.pk]), 'finished')
+        second.delete()
+
+        incremental = self._rollup_rows()
+        self.assertEqual(incremental[0][1:], (2, Decimal("200.00"), Decimal("2.50")))
+        rollups.rebuild()
+        self.assertEqual(self._rollup_rows(), incremental)
+
+
+class SendHawalaQuerySetTestCase(HawalaTestMixin, TestCase):
+    def test_default_currency_annotations_match_instance_methods(self):
+        usd = Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_default=True,
+                                      exchange_rate=Decimal("1.000000"))
+        eur = Currency.objects.create(code="EUR", name="Euro", symbol="€", exchange_rate=Decimal("0.800000"))
+        self._create_hawala(currency=eur, hawala_fee=Decimal("5.00"), hawala_fee_currency=eur)
+        self._create_hawala(currency=usd, amount=Decimal("50.00"), hawala_fee=Decimal("2.00"))
+        self._create_hawala(currency=eur, amount=Decimal("10.00"))
+
+        hawalas = sendhawala.objects.select_related('currency', 'hawala_fee_currency')
+        with self.assertNumQueries(1):
+            annotated = list(hawalas.with_default_currency_amounts().order_by('pk'))
+        for hawala in annotated:
+            self.assertEqual(hawala.amount_in_default, hawala.get_amount_in_default_currency(usd))
+            self.assertEqual(hawala.fee_in_default, hawala.get_fee_in_default_currency(usd))
+
+        with self.assertNumQueries(1):
+            totals = sendhawala.objects.default_currency_totals()
+        self.assertEqual(totals, {'count': 3, 'amount': Decimal("187.50"), 'fee': Decimal("8.25")})
+
+
+class CurrencyRegistryTestCase(HawalaTestMixin, TestCase):
+    def test_lookups_are_served_from_memory_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            usd = Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_default=True)
+            Currency.objects.create(code="AUD", name="Australian Dollar", symbol="$", is_active=False)
+        self.assertEqual(currency_registry.default(), usd)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(currency_registry.by_code("usd"), usd)
+            self.assertIsNone(currency_registry.by_code("AUD", active_only=True))
+            self.assertEqual([c.code for c in currency_registry.by_symbol("$")], ["AUD", "USD"])
+            self.assertEqual(currency_registry.active(), [usd])
+            # Hawalas without a currency take the default one without looking it up
+            hawala = sendhawala(sender_name="Sender", receiver_name="Receiver", amount=Decimal("1"))
+            hawala.currency = Currency.get_default_currency()
+            self.assertEqual(hawala.currency, usd)
+
+        # A change is read through until it commits, then rebuilt for everyone
+        eur = Currency.objects.create(code="EUR", name="Euro", symbol="€", is_default=True)
+        self.assertEqual(currency_registry.default(), eur)
+        with self.captureOnCommitCallbacks(execute=True):
+            eur.name = "Euro (EU)"
+            eur.save()
+        currency_registry.default()
+        with self.assertNumQueries(0):
+            self.assertEqual(currency_registry.default().name, "Euro (EU)")
+            self.assertEqual(Currency.get_active_currencies(), [eur, usd])
+
+    def test_lookups_hand_out_copies(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_default=True)
+        currency = currency_registry.by_code("USD")
+        currency.name = "Changed"
+        currency.is_default = False
+
+        self.assertEqual(currency_registry.by_code("USD").name, "US Dollar")
+        self.assertTrue(currency_registry.default().is_default)
+        self.assertIsNot(currency_registry.default(), currency_registry.default())
+
+
+class SharedCacheCheckTestCase(TestCase):
+    def test_per_process_cache_is_reported(self):
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                             'LOCATION': 'redis://localhost:6379/1'}}
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=redis):
+            self.assertEqual(check_shared_cache(), [])
+        with override_settings(CACHES=locmem):
+            self.assertEqual([message.id for message in check_shared_cache()], ['Core.W001'])
+            with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+                self.assertEqual([message.id for message in check_shared_cache()], ['Core.E001'])
@@ -0,0 +1,150 @@
+"""
+Status transitions of send hawalas.
+
+A transition is a conditional UPDATE guarded by the current status
+(``UPDATE ... SET status = <to> WHERE id = ... AND status = <from>``), so two
+clerks moving the same hawala cannot overwrite each other and no row is
+loaded, re-validated or fully rewritten. Rows whose status changed in the
+meantime are reported as conflicts.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ReceiveHawala, sendhawala
+from .signals import hawala_status_changed
+
+# Statuses a hawala may move to from each status
+LEGAL_TRANSITIONS = {
+    'started': {'snoozed', 'finished'},
+    'snoozed': {'started', 'finished'},
+    'finished': set(),
+}
+
+# Rows locked and updated per statement by the bulk transitions
+BULK_CHUNK_SIZE = 500
+
+
+class InvalidTransition(ValueError):
+    """The requested status change is not in LEGAL_TRANSITIONS"""
+
+
+class TransitionConflict(Exception):
+    """The hawala is not in a status the requested change can start from"""
+
+    def __init__(self, current_status):
+        self.current_status = current_status
+        super().__init__(f'Hawala is {current_status}')
+
+
+class BulkTransitionResult:
+    """Outcome of a bulk transition"""
+
+    def __init__(self):
+        # id -> status the hawala moved from
+        self.moved = {}
+        # id -> status that blocked the move
+        self.conflicts = {}
+        self.not_found = []
+
+    def as_dict(self):
+        return {
+            'moved': len(self.moved),
+            'moved_ids': sorted(self.moved),
+            'conflicts': [{'send_hawala_id': pk, 'status': current} for pk, current in sorted(self.conflicts.items())],
+            'not_found': self.not_found,
+        }
+
+
+def source_statuses(to_status, expected=None):
+    """Statuses a hawala may move to `to_status` from, optionally narrowed to `expected`"""
+    if to_status not in LEGAL_TRANSITIONS:
+        raise InvalidTransition(f'Unknown status: {to_status}')
+    sources = [status for status, targets in LEGAL_TRANSITIONS.items() if to_status in targets]
+    if expected is not None:
+        if expected not in sources:
+            raise InvalidTransition(f'A hawala cannot move from {expected} to {to_status}')
+        sources = [expected]
+    if not sources:
+        raise InvalidTransition(f'No hawala can move to {to_status}')
+    return sources
+
+
+def transition_hawala(pk, to_status, expected=None):
+    """
+    Move one hawala to `to_status` and return the status it moved from.
+
+    Raises InvalidTransition, TransitionConflict or sendhawala.DoesNotExist.
+    """
+    hawalas = sendhawala.objects.filter(pk=pk)
+    with transaction.atomic():
+        for from_status in source_statuses(to_status, expected):
+            if hawalas.filter(status=from_status).update(status=to_status, updated_at=timezone.now()):
+                hawala_status_changed.send(sender=sendhawala, hawala_ids=[pk],
+                                           from_status=from_status, to_status=to_status)
+                return from_status
+    current_status = hawalas.values_list('status', flat=True).first()
+    if current_status is None:
+        raise sendhawala.DoesNotExist(f'No sendhawala with id {pk}')
+    raise TransitionConflict(current_status)
+
+
+def bulk_transition(queryset, to_status, expected=None):
+    """
+    Move every hawala of `queryset` that can legally reach `to_status`.
+
+    Rows are locked and moved in chunks with one UPDATE per source status;
+    rows in any other status are reported as conflicts. Returns a
+    BulkTransitionResult.
+    """
+    result = BulkTransitionResult()
+    sources = source_statuses(to_status, expected)
+    with transaction.atomic():
+        for from_status in sources:
+            candidates = (
+                queryset.filter(status=from_status)
+                .select_for_update()
+                .order_by('pk')
+                .values_list('pk', flat=True)
+            )
+            last_pk = 0
+            while True:
+                chunk = list(candidates.filter(pk__gt=last_pk)[:BULK_CHUNK_SIZE])
+                if not chunk:
+                    break
+                sendhawala.objects.filter(pk__in=chunk, status=from_status).update(
+                    status=to_status, updated_at=timezone.now()
+                )
+                hawala_status_changed.send(sender=sendhawala, hawala_ids=chunk,
+                                           from_status=from_status, to_status=to_status)
+                result.moved.update((pk, from_status) for pk in chunk)
+                last_pk = chunk[-1]
+
+        blocked = queryset.exclude(status__in=sources + [to_status]).values_list('pk', 'status')
+        result.conflicts.update(blocked)
+    return result
+
+
+def bulk_transition_ids(ids, to_status, expected=None):
+    """bulk_transition for a list of hawala ids; unknown ids are reported as not found"""
+    ids = sorted(set(ids))
+    result = bulk_transition(sendhawala.objects.filter(pk__in=ids), to_status, expected)
+    known = set(result.moved) | set(result.conflicts)
+    unknown = [pk for pk in ids if pk not in known]
+    if unknown:
+        # Rows already in the target status are neither moved nor conflicting
+        existing = set(sendhawala.objects.filter(pk__in=unknown).values_list('pk', flat=True))
+        result.not_found = [pk for pk in unknown if pk not in existing]
+    return result
+
+
+def verify_receive_hawala(receive_hawala_id, saraf_id):
+    """
+    Mark a ReceiveHawala verified by a saraf unless it already is.
+    Returns the verification time, or None when it was not (or no longer) unverified.
+    """
+    verified_at = timezone.now()
+    updated = (
+        ReceiveHawala.objects.filter(pk=receive_hawala_id, verified_by__isnull=True)
+        .update(verified_by_id=saraf_id, verification_date=verified_at)
+    )
+    return verified_at if updated else None
@@ -0,0 +1,102 @@
+"""
+Resolution of currency_code / currency_symbol / currency_id input to active
+Currency rows, shared by the API serializers.
+
+Lookups read one snapshot of the in-memory currency registry
+(Core.currencies), so they cost no query and every lookup of a request
+agrees. Serializers get the resolver of their request through
+get_currency_resolver(context); nested serializers share it.
+
+The snapshot's instances are shared by every request of the process, so
+lookups hand out a copy of them, made once per currency and resolver.
+"""
+import copy
+
+from rest_framework import serializers
+
+from Core.currencies import currency_registry
+
+
+class CurrencyResolver:
+    def __init__(self):
+        self._snapshot = currency_registry.snapshot()
+        self._copies = {}
+
+    def _copy(self, currency):
+        if currency is None:
+            return None
+        if currency.pk not in self._copies:
+            self._copies[currency.pk] = copy.copy(currency)
+        return self._copies[currency.pk]
+
+    def code(self, code):
+        """Active currency by ISO code (any case), or None"""
+        currency = self._snapshot.by_code.get(str(code or '').strip().upper())
+        return self._copy(currency) if currency is not None and currency.is_active else None
+
+    def symbol(self, symbol):
+        """Active currencies using a symbol"""
+        return [self._copy(currency) for currency in self._snapshot.by_symbol.get(symbol, []) if currency.is_active]
+
+    def pk(self, pk):
+        """Active currency by id, or None"""
+        currency = self._snapshot.by_id.get(pk)
+        return self._copy(currency) if currency is not None and currency.is_active else None
+
+    def default(self):
+        return self._copy(self._snapshot.default)
+
+    def resolve(self, data, code_key='currency_code', symbol_key='currency_symbol', id_key='currency_id',
+                default_ok=False):
+        """
+        Pop the code / symbol / id keys from `data` and return the currency
+        they name (code first), or the default currency when `default_ok`.
+        """
+        code = data.pop(code_key, None)
+        symbol = data.pop(symbol_key, None)
+        cid = data.pop(id_key, None)
+        if code:
+            currency = self.code(code)
+            if currency is None:
+                raise serializers.ValidationError({code_key: 'Invalid or inactive currency code'})
+            return currency
+        if symbol:
+            matches = self.symbol(symbol)
+            if not matches:
+                raise serializers.ValidationError({symbol_key: 'Invalid or inactive currency symbol'})
+            if len(matches) > 1:
+                raise serializers.ValidationError({symbol_key: 'Ambiguous symbol. Provide currency_code to disambiguate.'})
+            return matches[0]
+        if cid is not None:
+            currency = self.pk(cid)
+            if currency is None:
+                raise serializers.ValidationError({id_key: 'Invalid or inactive currency'})
+            return currency
+        if default_ok and self.default():
+            return self.default()
+        raise serializers.ValidationError({code_key: 'Provide currency_code or currency_symbol'})
+
+    def resolve_many(self, items, **keys):
+        """
+        resolve() every dict of a list (they are not modified). Raises one
+        ValidationError with an error (or {}) per item if any fails.
+        """
+        currencies, errors = [], []
+        for item in items:
+            try:
+                currencies.append(self.resolve(dict(item), **keys))
+                errors.append({})
+            except serializers.ValidationError as e:
+                errors.append(e.detail)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return currencies
+
+
+def get_currency_resolver(context=None):
+    """The resolver shared by all serializers of a request (a new one without context)"""
+    if context is None:
+        return CurrencyResolver()
+    if 'currency_resolver' not in context:
+        context['currency_resolver'] = CurrencyResolver()
+    return context['currency_resolver']
@@ -0,0 +1,122 @@
+"""
+Keyset (cursor) pagination for the APIView based list endpoints
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class PaginationError(ValueError):
+    """Raised for malformed cursor or page_size query parameters"""
+
+
+def approximate_count(queryset):
+    """
+    Cheap row count for a queryset.
+
+    Unfiltered querysets use the planner statistics of PostgreSQL / MySQL when
+    available; everything else falls back to an exact COUNT(*).
+    Returns (count, is_estimate).
+    """
+    if not queryset.query.where:
+        table = queryset.model._meta.db_table
+        sql = None
+        if connection.vendor == 'postgresql':
+            sql = "SELECT reltuples::bigint FROM pg_class WHERE relname = %s"
+        elif connection.vendor == 'mysql':
+            sql = ("SELECT table_rows FROM information_schema.tables "
+                   "WHERE table_schema = DATABASE() AND table_name = %s")
+        if sql:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [table])
+                row = cursor.fetchone()
+            if row and row[0] and row[0] > 0:
+                return int(row[0]), True
+    return queryset.count(), False
+
+
+class KeysetPagination:
+    """
+    Paginate newest first on (time_field, id_field) with opaque cursors.
+
+    Each page is a single range scan on the composite index, so page 1000
+    costs the same as page 1. Query parameters:
+    - cursor: value of `next_cursor` from the previous page
+    - page_size: rows per page (capped at API_MAX_PAGE_SIZE)
+    - include_total: "true" to add an (approximate) `count`
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    total_query_param = 'include_total'
+
+    def __init__(self, time_field='created_at', id_field='id'):
+        self.time_field = time_field
+        self.id_field = id_field
+        self.page_size = None
+        self.next_cursor = None
+        self.total = None
+
+    def get_page_size(self, request):
+        default = getattr(settings, 'API_PAGE_SIZE', 50)
+        maximum = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw in (None, ''):
+            return default
+        try:
+            page_size = int(raw)
+        except ValueError:
+            raise PaginationError('page_size must be a valid integer')
+        if page_size < 1:
+            raise PaginationError('page_size must be greater than 0')
+        return min(page_size, maximum)
+
+    def encode_cursor(self, obj):
+        position = [getattr(obj, self.time_field).isoformat(), getattr(obj, self.id_field)]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            moment = parse_datetime(timestamp)
+        except (ValueError, TypeError):
+            raise PaginationError('Invalid cursor')
+        if moment is None or not isinstance(pk, int):
+            raise PaginationError('Invalid cursor')
+        return moment, pk
+
+    def paginate_queryset(self, queryset, request):
+        """Return the rows of the requested page"""
+        self.page_size = self.get_page_size(request)
+
+        if request.query_params.get(self.total_query_param, '').lower() in ('true', '1', 'yes'):
+            self.total = approximate_count(queryset)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            moment, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.time_field}__lt': moment}) |
+                Q(**{self.time_field: moment, f'{self.id_field}__lt': pk})
+            )
+
+        queryset = queryset.order_by(f'-{self.time_field}', f'-{self.id_field}')
+        rows = list(queryset[:self.page_size + 1])
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_cursor = self.encode_cursor(rows[-1])
+        return rows
+
+    def get_paginated_data(self, results):
+        data = {
+            'next_cursor': self.next_cursor,
+            'page_size': self.page_size,
+            'results': results,
+        }
+        if self.total is not None:
+            data['count'], data['count_is_estimate'] = self.total
+        return data
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import models, transaction
 from Core.models import (
@@ -8,6 +9,10 @@ from Core.models import (
     Message, MessageAttachment, normal_user_Profile, CustomerAccount, CustomerBalance,
     SarafPost,
 )
+from Core import rollups
+from Core.name_search import index_hawalas
+from Core.sequences import hawala_number_allocator
+from .currency_resolver import get_currency_resolver
 
 class CurrencySerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,31 +34,8 @@ class SupportedCurrencySerializer(serializers.ModelSerializer):
         model = SupportedCurrency
         fields = ['id', 'currency', 'currency_id', 'currency_symbol', 'currency_code', 'created_at']
 
-    def _resolve_currency(self, attrs):
-        code = attrs.pop('currency_code', None)
-        symbol = attrs.pop('currency_symbol', None)
-        cid = attrs.pop('currency_id', None)
-        if code:
-            try:
-                return Currency.objects.get(code__iexact=code, is_active=True)
-            except Currency.DoesNotExist:
-                raise serializers.ValidationError({'currency_code': 'Invalid or inactive currency code'})
-        if symbol:
-            qs = Currency.objects.filter(symbol=symbol, is_active=True)
-            if not qs.exists():
-                raise serializers.ValidationError({'currency_symbol': 'Invalid or inactive currency symbol'})
-            if qs.count() > 1:
-                raise serializers.ValidationError({'currency_symbol': 'Ambiguous symbol. Provide currency_code to disambiguate.'})
-            return qs.first()
-        if cid is not None:
-            try:
-                return Currency.objects.get(id=cid, is_active=True)
-            except Currency.DoesNotExist:
-                raise serializers.ValidationError({'currency_id': 'Invalid or inactive currency id'})
-        raise serializers.ValidationError({'currency_code': 'Provide currency_code or currency_symbol'})
-
     def create(self, validated_data):
-        currency = self._resolve_currency(validated_data)
+        currency = get_currency_resolver(self.context).resolve(validated_data)
         validated_data['currency'] = currency
         return super().create(validated_data)
 
@@ -74,10 +56,10 @@ class sendhawalaSerializer(serializers.ModelSerializer):
         model = sendhawala
         fields = [
             'send_hawala_id', 'hawala_number', 'sender_name', 'receiver_name', 'amount', 'currency', 'currency_id', 'currency_code', 'currency_symbol',
-            'sender_phone', 'receiver_location', 'exchanger_location', 'hawala_fee', 'hawala_fee_currency', 'hawala_fee_currency_id', 'hawala_fee_currency_code', 'hawala_fee_currency_symbol',
+            'sender_phone', 'receiver_location', 'exchanger_location', 'receiver_province', 'exchanger_province', 'hawala_fee', 'hawala_fee_currency', 'hawala_fee_currency_id', 'hawala_fee_currency_code', 'hawala_fee_currency_symbol',
             'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['send_hawala_id', 'hawala_number', 'created_at', 'updated_at']
+        read_only_fields = ['send_hawala_id', 'hawala_number', 'receiver_province', 'exchanger_province', 'created_at', 'updated_at']
         
     def validate(self, data):
         """Add validation for required fields"""
@@ -96,44 +78,98 @@ class sendhawalaSerializer(serializers.ModelSerializer):
             
         return data
 
-    def _resolve_currency(self, validated_data, code_key, symbol_key, id_key, default_ok=False):
-        code = validated_data.pop(code_key, None)
-        symbol = validated_data.pop(symbol_key, None)
-        cid = validated_data.pop(id_key, None)
-        if code:
-            try:
-                return Currency.objects.get(code__iexact=code, is_active=True)
-            except Currency.DoesNotExist:
-                raise serializers.ValidationError({code_key: 'Invalid or inactive currency code'})
-        if symbol:
-            qs = Currency.objects.filter(symbol=symbol, is_active=True)
-            if not qs.exists():
-                raise serializers.ValidationError({symbol_key: 'Invalid or inactive currency symbol'})
-            if qs.count() > 1:
-                raise serializers.ValidationError({symbol_key: 'Ambiguous symbol. Provide currency_code to disambiguate.'})
-            return qs.first()
-        if cid is not None:
-            try:
-                return Currency.objects.get(id=cid, is_active=True)
-            except Currency.DoesNotExist:
-                raise serializers.ValidationError({id_key: 'Invalid or inactive currency'})
-        if default_ok:
-            default_currency = Currency.get_default_currency()
-            if default_currency:
-                return default_currency
-        raise serializers.ValidationError({code_key: 'Provide currency_code or currency_symbol'})
-
     def create(self, validated_data):
+        resolver = get_currency_resolver(self.context)
         with transaction.atomic():
             try:
-                currency = self._resolve_currency(validated_data, 'currency_code', 'currency_symbol', 'currency_id', default_ok=True)
-                fee_currency = self._resolve_currency(validated_data, 'hawala_fee_currency_code', 'hawala_fee_currency_symbol', 'hawala_fee_currency_id', default_ok=True)
+                currency = resolver.resolve(validated_data, default_ok=True)
+                fee_currency = resolver.resolve(validated_data, 'hawala_fee_currency_code', 'hawala_fee_currency_symbol', 'hawala_fee_currency_id', default_ok=True)
                 validated_data['currency'] = currency
                 validated_data['hawala_fee_currency'] = fee_currency
                 return super().create(validated_data)
             except Exception as e:
                 raise serializers.ValidationError({'error': f'Failed to create hawala: {str(e)}'})
 
+class sendhawalaBulkSerializer(serializers.Serializer):
+    """
+    Create a batch of hawalas at once.
+
+    Every row is validated like sendhawalaSerializer, but in memory; rows that
+    fail are reported by their index and the valid ones are still created,
+    with one block of hawala numbers and one bulk INSERT.
+    """
+    hawalas = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_hawalas(self, value):
+        max_rows = getattr(settings, 'HAWALA_BULK_MAX_ROWS', 1000)
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f'At most {max_rows} hawalas can be sent in one batch')
+        return value
+
+    def create(self, validated_data):
+        """Return (created hawalas, list of {'index', 'errors'} for rejected rows)"""
+        resolver = get_currency_resolver(self.context)
+        pending = []
+        errors = []
+        for index, row in enumerate(validated_data['hawalas']):
+            row_serializer = sendhawalaSerializer(data=row)
+            if not row_serializer.is_valid():
+                errors.append({'index': index, 'errors': row_serializer.errors})
+                continue
+
+            data = dict(row_serializer.validated_data)
+            try:
+                data['currency'] = resolver.resolve(data, default_ok=True)
+                data['hawala_fee_currency'] = resolver.resolve(data, 'hawala_fee_currency_code', 'hawala_fee_currency_symbol', 'hawala_fee_currency_id', default_ok=True)
+            except serializers.ValidationError as e:
+                errors.append({'index': index, 'errors': e.detail})
+                continue
+
+            hawala = sendhawala(**data)
+            hawala.assign_provinces()
+            try:
+                # Currencies and provinces were resolved in memory, so skip the per-row FK lookups of full_clean()
+                hawala.clean_fields(exclude=['hawala_number', 'currency', 'hawala_fee_currency',
+                                            'receiver_province', 'exchanger_province'])
+                hawala.clean()
+            except DjangoValidationError as e:
+                errors.append({'index': index, 'errors': e.message_dict})
+                continue
+            pending.append(hawala)
+
+        if not pending:
+            return [], errors
+
+        with transaction.atomic():
+            numbers = hawala_number_allocator.allocate_block(len(pending))
+            for hawala, number in zip(pending, numbers):
+                hawala.hawala_number = number
+            created = sendhawala.objects.bulk_create(pending)
+            if any(hawala.pk is None for hawala in created):
+                # Backends without RETURNING (MySQL) do not set primary keys on bulk_create
+                saved = sendhawala.objects.filter(hawala_number__in=list(numbers)).in_bulk(field_name='hawala_number')
+                for hawala in created:
+                    hawala.pk = saved[hawala.hawala_number].pk
+            # bulk_create does not send post_save, so index the names and count the rollups here
+            index_hawalas(created)
+            rollups.record_created(created)
+        return created, errors
+
+class CurrencyConversionSerializer(serializers.Serializer):
+    """Batch of [amount, from_code, to_code] conversions"""
+    conversions = serializers.ListField(
+        child=serializers.ListField(child=serializers.CharField(), min_length=3, max_length=3),
+        allow_empty=False,
+    )
+    places = serializers.IntegerField(min_value=0, max_value=6, default=2)
+
+    def validate_conversions(self, value):
+        max_rows = getattr(settings, 'CURRENCY_CONVERT_MAX_ROWS', 10000)
+        if len(value) > max_rows:
+            raise serializers.ValidationError(f'At most {max_rows} conversions can be sent in one batch')
+        return value
+
+
 class SarafProfileSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     confirm_password = serializers.CharField(write_only=True)
@@ -187,41 +223,20 @@ class SarafProfileSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError({'province_names': f"Invalid or inactive provinces: {', '.join(missing)}"})
         
         # Validate currencies before creating profile
-        validated_currencies = []
+        resolver = get_currency_resolver(self.context)
         if supported_currencies_input:
-            errors = []
-            for item in supported_currencies_input:
-                sc_ser = SupportedCurrencySerializer(data=item)
-                if sc_ser.is_valid():
-                    # Resolve currency from validated data and store the currency object
-                    currency = sc_ser._resolve_currency(sc_ser.validated_data.copy())
-                    validated_currencies.append({'currency': currency})
-                else:
-                    errors.append(sc_ser.errors)
-            if errors:
-                raise serializers.ValidationError({'supported_currencies_input': errors})
+            # Items were validated by the nested serializer, only the currencies are left to resolve
+            try:
+                currencies = resolver.resolve_many(supported_currencies_input)
+            except serializers.ValidationError as e:
+                raise serializers.ValidationError({'supported_currencies_input': e.detail})
+            validated_currencies = [{'currency': currency} for currency in dict.fromkeys(currencies)]
         else:
             # Backward compatible single currency validation
-            currency = None
-            if currency_code:
-                try:
-                    currency = Currency.objects.get(code__iexact=currency_code, is_active=True)
-                except Currency.DoesNotExist:
-                    raise serializers.ValidationError({'currency_code': 'Invalid or inactive currency code.'})
-            elif currency_symbol:
-                qs = Currency.objects.filter(symbol=currency_symbol, is_active=True)
-                if not qs.exists():
-                    raise serializers.ValidationError({'currency_symbol': 'Invalid or inactive currency symbol.'})
-                if qs.count() > 1:
-                    raise serializers.ValidationError({'currency_symbol': 'Ambiguous symbol. Provide currency_code to disambiguate.'})
-                currency = qs.first()
-            elif currency_id is not None:
-                try:
-                    currency = Currency.objects.get(id=currency_id, is_active=True)
-                except Currency.DoesNotExist:
-                    raise serializers.ValidationError({'currency_id': 'Invalid or inactive currency.'})
-            else:
+            if not (currency_code or currency_symbol or currency_id is not None):
                 raise serializers.ValidationError({'supported_currencies_input': 'Provide supported_currencies_input (preferred) or a single currency via currency_code/symbol/id'})
+            currency = resolver.resolve({'currency_code': currency_code, 'currency_symbol': currency_symbol,
+                                         'currency_id': currency_id})
             validated_currencies = [{'currency': currency}]
         
         if service_ids:
@@ -356,14 +371,13 @@ class NormalUserProfileSerializer(serializers.ModelSerializer):
         
         # Validate preferred currency before creating profile
         preferred_currency_id = validated_data.get('preferred_currency_id')
+        resolver = get_currency_resolver(self.context)
         if preferred_currency_id:
-            try:
-                Currency.objects.get(id=preferred_currency_id, is_active=True)
-            except Currency.DoesNotExist:
+            if resolver.pk(preferred_currency_id) is None:
                 raise serializers.ValidationError({'preferred_currency_id': 'Invalid or inactive currency'})
         else:
             # Set default currency if not provided
-            default_currency = Currency.get_default_currency()
+            default_currency = resolver.default()
             if default_currency:
                 validated_data['preferred_currency_id'] = default_currency.id
         
@@ -442,6 +456,10 @@ class BalanceOperationInputSerializer(serializers.Serializer):
 
 class ReceiveHawalaSerializer(serializers.ModelSerializer):
     sendhawala_details = serializers.SerializerMethodField(read_only=True)
+
+    # Related objects rendered for every row; querysets passed in should
+    # select them so a list costs the same number of queries as one row
+    select_related_fields = ['sendhawala__currency', 'sendhawala__hawala_fee_currency']
     
     class Meta:
         model = ReceiveHawala
@@ -450,7 +468,10 @@ class ReceiveHawalaSerializer(serializers.ModelSerializer):
     def get_sendhawala_details(self, obj):
         """Get the related sendhawala details"""
         if obj.sendhawala:
-            return sendhawalaSerializer(obj.sendhawala).data
+            # One nested serializer is reused for all rows instead of being rebuilt per row
+            if not hasattr(self, '_sendhawala_serializer'):
+                self._sendhawala_serializer = sendhawalaSerializer()
+            return self._sendhawala_serializer.to_representation(obj.sendhawala)
         return None
 
 class ReceiveHawalaCreateSerializer(serializers.ModelSerializer):
@@ -512,20 +533,11 @@ class ReceiveHawalaCreateSerializer(serializers.ModelSerializer):
                 'dates': send_hawala.created_at,
             }
             
-            # Handle location fields (convert string to Province if needed)
-            if send_hawala.receiver_location:
-                try:
-                    receiver_location = Province.objects.get(name__iexact=send_hawala.receiver_location, is_active=True)
-                    receive_hawala_data['receiver_location'] = receiver_location
-                except Province.DoesNotExist:
-                    pass  # Keep as None if province not found
-            
-            if send_hawala.exchanger_location:
-                try:
-                    exchanger_location = Province.objects.get(name__iexact=send_hawala.exchanger_location, is_active=True)
-                    receive_hawala_data['exchanger_location'] = exchanger_location
-                except Province.DoesNotExist:
-                    pass  # Keep as None if province not found
+            # Locations were resolved to provinces when the hawala was saved
+            if send_hawala.receiver_province_id is None or send_hawala.exchanger_province_id is None:
+                send_hawala.assign_provinces()
+            receive_hawala_data['receiver_location_id'] = send_hawala.receiver_province_id
+            receive_hawala_data['exchanger_location_id'] = send_hawala.exchanger_province_id
             
             # Add receiver verification data
             receive_hawala_data.update(validated_data)
@@ -668,11 +680,11 @@ class SarafLoanCreateSerializer(serializers.ModelSerializer):
         fields = ['borrower', 'currency_code', 'amount', 'status', 'description']
     
     def validate_currency_code(self, value):
-        try:
-            Currency.objects.get(code=value, is_active=True)
-        except Currency.DoesNotExist:
+        """Resolved to the Currency itself, so create() does not look it up again"""
+        currency = get_currency_resolver(self.context).code(value)
+        if currency is None:
             raise serializers.ValidationError(f"Currency with code '{value}' not found or inactive")
-        return value
+        return currency
     
     def validate_borrower(self, value):
         """Validate that borrower is a colleague of the authenticated user"""
@@ -698,16 +710,11 @@ class SarafLoanCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Request context required")
         
         lender_id = request.session.get('user_id')
-        currency_code = validated_data.pop('currency_code')
         
         with transaction.atomic():
-            try:
-                currency = Currency.objects.get(code=currency_code, is_active=True)
-                validated_data['currency'] = currency
-                validated_data['lender_id'] = lender_id
-                return super().create(validated_data)
-            except Currency.DoesNotExist:
-                raise serializers.ValidationError(f"Currency with code '{currency_code}' not found")
+            validated_data['currency'] = validated_data.pop('currency_code')
+            validated_data['lender_id'] = lender_id
+            return super().create(validated_data)
 
 class CurrencyExchangeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -723,18 +730,17 @@ class CurrencyExchangeCreateSerializer(serializers.ModelSerializer):
         fields = ['receiver', 'from_currency_code', 'to_currency_code', 'amount', 'rate', 'status', 'description']
     
     def validate_from_currency_code(self, value):
-        try:
-            Currency.objects.get(code=value, is_active=True)
-        except Currency.DoesNotExist:
+        """Resolved to the Currency itself, so create() does not look it up again"""
+        currency = get_currency_resolver(self.context).code(value)
+        if currency is None:
             raise serializers.ValidationError(f"From currency with code '{value}' not found or inactive")
-        return value
+        return currency
     
     def validate_to_currency_code(self, value):
-        try:
-            Currency.objects.get(code=value, is_active=True)
-        except Currency.DoesNotExist:
+        currency = get_currency_resolver(self.context).code(value)
+        if currency is None:
             raise serializers.ValidationError(f"To currency with code '{value}' not found or inactive")
-        return value
+        return currency
     
     def validate_receiver(self, value):
         """Validate that receiver is a colleague of the authenticated user"""
@@ -771,21 +777,13 @@ class CurrencyExchangeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Request context required")
         
         exchanger_id = request.session.get('user_id')
-        from_currency_code = validated_data.pop('from_currency_code')
-        to_currency_code = validated_data.pop('to_currency_code')
         
         with transaction.atomic():
-            try:
-                from_currency = Currency.objects.get(code=from_currency_code, is_active=True)
-                to_currency = Currency.objects.get(code=to_currency_code, is_active=True)
-                
-                validated_data['from_currency'] = from_currency
-                validated_data['to_currency'] = to_currency
-                validated_data['exchanger_id'] = exchanger_id
-                
-                return super().create(validated_data)
-            except Currency.DoesNotExist as e:
-                raise serializers.ValidationError(f"Currency not found: {str(e)}")
+            validated_data['from_currency'] = validated_data.pop('from_currency_code')
+            validated_data['to_currency'] = validated_data.pop('to_currency_code')
+            validated_data['exchanger_id'] = exchanger_id
+            
+            return super().create(validated_data)
 
 # SarafPost Serializer
 class SarafPostSerializer(serializers.ModelSerializer):
@@ -0,0 +1,364 @@
+import gzip
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from Core.models import Currency, Province, ReceiveHawala, SarafProfile, SupportedCurrency, sendhawala
+from Core.cache_utils import get_version
+from Core.catalogue import catalogue_payloads
+from Core.currencies import currency_registry
+from Core.currency_utils import update_exchange_rates
+from Core.provinces import province_index
+from Core.quotes import quote_index
+from Core.sequences import hawala_number_allocator
+from .currency_resolver import get_currency_resolver
+
+
+class HawalaAPITestCase(TestCase):
+    def setUp(self):
+        hawala_number_allocator.reset()
+        province_index.clear()
+        currency_registry.clear()
+        self.client = APIClient()
+        session = self.client.session
+        session['is_authenticated'] = True
+        session['user_type'] = 'saraf'
+        session['user_id'] = 1
+        session.save()
+        self.usd = Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_active=True, is_default=True,
+                                           exchange_rate=Decimal("1.000000"))
+
+    def create_hawala(self, **kwargs):
+        data = dict(
+            sender_name="Sender",
+            receiver_name="Receiver",
+            amount=Decimal("100.00"),
+            currency=self.usd,
+            receiver_location="Kabul",
+            exchanger_location="Herat",
+            sender_phone="0700000001",
+        )
+        data.update(kwargs)
+        return sendhawala.objects.create(**data)
+
+    def test_sendhawala_list_walks_pages_with_cursor(self):
+        """
+        sendhawalaAV should return newest-first pages linked by next_cursor without repeating rows.
+        """
+        created = [self.create_hawala(sender_name=f"Sender {i}") for i in range(5)]
+
+        seen = []
+        url = '/api/sendhawala/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(row['send_hawala_id'] for row in response.data['results'])
+            cursor = response.data['next_cursor']
+            url = f'/api/sendhawala/?page_size=2&cursor={cursor}' if cursor else None
+
+        self.assertEqual(seen, [h.send_hawala_id for h in reversed(created)])
+
+    def test_filtered_sendhawala_rejects_bad_cursor_and_reports_total(self):
+        self.create_hawala(status='started')
+        self.create_hawala(status='finished')
+
+        response = self.client.get('/api/send-hawala/filter/?status=started&include_total=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get('/api/send-hawala/filter/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_filtered_sendhawala_matches_names_across_scripts(self):
+        latin = self.create_hawala(sender_name="Ahmad Karimi")
+        dari = self.create_hawala(sender_name="احمد کریمی")
+        self.create_hawala(sender_name="Mahmood Zahir")
+
+        for term in ("Ahmed", "احمد", "kari"):
+            response = self.client.get('/api/send-hawala/filter/', {'sender_name': term})
+            self.assertEqual(response.status_code, 200)
+            found = {row['send_hawala_id'] for row in response.data['results']}
+            self.assertEqual(found, {latin.send_hawala_id, dari.send_hawala_id}, term)
+
+    def test_filtered_sendhawala_matches_inside_words(self):
+        hawala = self.create_hawala(receiver_name="Abdulrahman")
+        self.create_hawala(receiver_name="Rahim")
+
+        response = self.client.get('/api/send-hawala/filter/', {'receiver_name': 'rahman'})
+        self.assertEqual([row['send_hawala_id'] for row in response.data['results']], [hawala.send_hawala_id])
+
+    def test_bulk_create_reports_bad_rows_and_creates_the_rest(self):
+        row = dict(sender_name="Ahmad", receiver_name="Omar", amount="50.00", sender_phone="0700000001",
+                   receiver_location="Kabul", exchanger_location="Herat", currency_code="usd")
+        rows = [row, dict(row, sender_phone="12345"), dict(row, currency_code="XXX"), dict(row, receiver_name="Karim")]
+
+        response = self.client.post('/api/sendhawala/bulk/', {'hawalas': rows}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertEqual(len(response.data['created']), 2)
+        numbers = [row['hawala_number'] for row in response.data['created']]
+        self.assertEqual(numbers[1], numbers[0] + 1)
+        self.assertEqual(sendhawala.objects.filter(currency=self.usd, hawala_fee_currency=self.usd).count(), 2)
+        # Names of bulk created rows are searchable too
+        response = self.client.get('/api/send-hawala/filter/', {'receiver_name': 'karim'})
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_hawala_locations_resolve_to_provinces(self):
+        # The provinces below are rolled back with the test, do not leave them indexed
+        self.addCleanup(province_index.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            kabul = Province.objects.create(name="Kabul")
+            balkh = Province.objects.create(name="Balkh")
+        hawala = self.create_hawala(receiver_location="کابل", exchanger_location="mazar-i-sharif")
+        self.assertEqual((hawala.receiver_province, hawala.exchanger_province), (kabul, balkh))
+
+        # The index is in memory: resolving again does not hit the database
+        with self.assertNumQueries(0):
+            self.assertEqual(province_index.resolve(" KABUL "), kabul)
+
+        self.create_hawala(receiver_location="Balkh")
+        response = self.client.get('/api/send-hawala/filter/', {'receiver_province': 'Kabul'})
+        self.assertEqual([row['send_hawala_id'] for row in response.data['results']], [hawala.send_hawala_id])
+        response = self.client.get('/api/send-hawala/filter/', {'receiver_province': str(kabul.id)})
+        self.assertEqual(len(response.data['results']), 1)
+        # Digits int() does not take are looked up as names
+        self.assertEqual(self.client.get('/api/send-hawala/filter/', {'receiver_province': '²'}).status_code, 400)
+
+    def test_receive_hawala_list_query_count_does_not_grow_with_rows(self):
+        afn = Currency.objects.create(code="AFN", name="Afghani", symbol="؋", is_active=True,
+                                      exchange_rate=Decimal("70.000000"))
+
+        def receive(count):
+            for _ in range(count):
+                hawala = self.create_hawala(hawala_fee=Decimal("5.00"), hawala_fee_currency=afn)
+                ReceiveHawala.objects.create(sendhawala=hawala, hawala_number=str(hawala.hawala_number),
+                                             currency=hawala.currency, hawala_fee_currency=afn,
+                                             receiver_phone="0700000002", receiver_address="Kabul")
+
+        def list_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/receive-hawala/list/')
+            self.assertEqual(response.status_code, 200)
+            return len(queries), response.data['results']
+
+        receive(1)
+        one_row_queries, results = list_queries()
+        self.assertEqual(len(results), 1)
+        receive(9)
+        ten_row_queries, results = list_queries()
+        self.assertEqual(len(results), 10)
+
+        self.assertEqual(ten_row_queries, one_row_queries)
+        self.assertEqual(results[0]['sendhawala_details']['hawala_fee_currency']['code'], 'AFN')
+
+    def test_export_streams_csv_and_ndjson(self):
+        started = self.create_hawala(status='started', sender_name="Ahmad")
+        self.create_hawala(status='finished')
+
+        response = self.client.get('/api/sendhawala/export/', {'status': 'started'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('send_hawala_id,hawala_number,'))
+        self.assertIn('Ahmad', lines[1])
+
+        response = self.client.get('/api/sendhawala/export/', {'export_format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['send_hawala_id'] for row in rows][0], started.send_hawala_id)
+        self.assertEqual(rows[0]['currency'], 'USD')
+        self.assertIsNone(rows[0]['receiver_phone'])
+
+        # One keyset query per chunk, so no backend holds the whole result set
+        self.create_hawala(status='started')
+        with mock.patch('Core.exports.CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/sendhawala/export/', {'export_format': 'ndjson'})
+            rows = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len([query for query in queries if query['sql'].endswith('LIMIT 2')]), 2)
+
+    def test_dashboard_totals_read_rollups(self):
+        self.create_hawala(status='started', amount=Decimal("10.00"))
+        self.create_hawala(status='started', amount=Decimal("15.00"))
+        self.create_hawala(status='finished')
+
+        response = self.client.get('/api/dashboard/hawala-totals/', {'group_by': 'currency,status'})
+        self.assertEqual(response.status_code, 200)
+        totals = {row['status']: (row['currency__code'], row['hawala_count'], row['amount_sum'])
+                  for row in response.data['results']}
+        self.assertEqual(totals, {'finished': ('USD', 1, Decimal("100.00")),
+                                  'started': ('USD', 2, Decimal("25.00"))})
+
+        # Amounts in different currencies are never added up
+        afn = Currency.objects.create(code="AFN", name="Afghani", symbol="؋")
+        self.create_hawala(status='started', amount=Decimal("700.00"), currency=afn)
+        response = self.client.get('/api/dashboard/hawala-totals/', {'group_by': 'status'})
+        self.assertEqual(response.data['group_by'], ['status', 'currency', 'fee_currency'])
+        totals = {(row['status'], row['currency__code']): row['amount_sum'] for row in response.data['results']}
+        self.assertEqual(totals, {('finished', 'USD'): Decimal("100.00"), ('started', 'USD'): Decimal("25.00"),
+                                  ('started', 'AFN'): Decimal("700.00")})
+
+        response = self.client.get('/api/dashboard/hawala-totals/', {'group_by': 'sender'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_currency_list_supports_conditional_get(self):
+        response = self.client.get('/api/currencies/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # Anonymous, so not even a session is loaded
+        with self.assertNumQueries(0):
+            response = APIClient().get('/api/currencies/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        # If-Modified-Since alone cannot tell two bumps within a second apart, so it is not honoured
+        response = APIClient().get('/api/currencies/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+        etag = self.client.get('/api/currencies/?code=usd')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usd.name = "Dollar"
+            self.usd.save()
+        response = self.client.get('/api/currencies/?code=usd', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], "Dollar")
+
+    def test_currency_resolver_is_shared_and_queries_nothing(self):
+        context = {}
+        resolver = get_currency_resolver(context)
+        self.assertIs(get_currency_resolver(context), resolver)
+
+        items = [{'currency_code': 'usd'}, {'currency_symbol': '$'}, {'currency_id': self.usd.id}]
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.resolve_many(items), [self.usd] * 3)
+            with self.assertRaises(serializers.ValidationError) as raised:
+                resolver.resolve_many([{'currency_code': 'usd'}, {'currency_code': 'XXX'}])
+        self.assertEqual(raised.exception.detail[0], {})
+        self.assertIn('currency_code', raised.exception.detail[1])
+
+        # Callers get their own copy of the registry's shared instances
+        resolved = resolver.code('usd')
+        self.assertIs(resolver.pk(self.usd.id), resolved)
+        resolved.name = "Changed"
+        self.assertEqual(get_currency_resolver().code('usd').name, self.usd.name)
+
+    def test_batch_conversion_rounds_half_up(self):
+        Currency.objects.create(code="AFN", name="Afghani", symbol="؋", exchange_rate=Decimal("70.000000"))
+        Currency.objects.create(code="EUR", name="Euro", symbol="€", exchange_rate=Decimal("0.800000"))
+        conversions = [["1.005", "USD", "USD"], ["2", "usd", "AFN"], ["1", "AFN", "EUR"], [10, "EUR", "AFN"]]
+
+        response = self.client.post('/api/currencies/convert/', {'conversions': conversions}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], ["1.01", "140.00", "0.01", "875.00"])
+        self.assertEqual(response.data['rounding'], 'ROUND_HALF_UP')
+
+        response = self.client.post('/api/currencies/convert/',
+                                    {'conversions': [["1", "USD", "XXX"], ["abc", "USD", "AFN"], ["1", "USD", "AFN"],
+                                                     ["9e999999", "USD", "AFN"]], 'places': 4},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.data['errors']], [0, 1, 3])
+
+    def test_currency_catalogue_is_compact_precompressed_and_versioned(self):
+        self.addCleanup(catalogue_payloads.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            Currency.objects.create(code="EUR", name="Euro", name_farsi="یورو", symbol="€", is_popular=True)
+
+        response = self.client.get('/api/currencies/catalogue/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {
+            'fields': ['code', 'symbol', 'name', 'name_english', 'name_farsi', 'is_popular'],
+            'currencies': [["EUR", "€", "Euro", "", "یورو", True], ["USD", "$", "US Dollar", "", "", False]],
+        })
+
+        anonymous = APIClient()
+        with self.assertNumQueries(0):
+            response = anonymous.get('/api/currencies/catalogue/', {'fields': 'popular,code'},
+                                     HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content)),
+                         {'fields': ['code', 'is_popular'], 'currencies': [["EUR", True], ["USD", False]]})
+
+        # Each encoding has its own ETag
+        etag = response['ETag']
+        self.assertNotEqual(anonymous.get('/api/currencies/catalogue/', {'fields': 'popular,code'})['ETag'], etag)
+        response = anonymous.get('/api/currencies/catalogue/', {'fields': 'popular,code'},
+                                 HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+        # Rate updates leave the catalogue (and its ETag) alone
+        with self.captureOnCommitCallbacks(execute=True):
+            update_exchange_rates({'EUR': '1.1'}, 'USD')
+        response = anonymous.get('/api/currencies/catalogue/', {'fields': 'popular,code'},
+                                 HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usd.is_popular = True
+            self.usd.save()
+        response = anonymous.get('/api/currencies/catalogue/', {'fields': 'popular,code'},
+                                 HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(gzip.decompress(response.content))['currencies'], [["EUR", True], ["USD", True]])
+
+        self.assertEqual(self.client.get('/api/currencies/catalogue/', {'fields': 'code,rates'}).status_code, 400)
+
+    def test_best_quotes_come_sorted_from_the_index(self):
+        self.addCleanup(province_index.clear)
+        self.addCleanup(quote_index.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            kabul = Province.objects.create(name="Kabul")
+            eur = Currency.objects.create(code="EUR", name="Euro", symbol="€", exchange_rate=Decimal("0.900000"))
+            for number, custom_rate in enumerate([None, Decimal("0.950000"), Decimal("0.880000")]):
+                saraf = SarafProfile.objects.create(
+                    name=f"Saraf{number}", last_name="Khan", phone=f"070000001{number}", email=f"s{number}@example.com",
+                    password_hash="init", license_no=f"LIC-{number}", saraf_address="Address",
+                )
+                SupportedCurrency.objects.create(saraf=saraf, currency=eur, custom_rate=custom_rate)
+                if number:
+                    saraf.provinces.add(kabul)
+
+        response = self.client.get('/api/quotes/best/', {'currency': 'eur'})
+        self.assertEqual([quote['rate'] for quote in response.data['quotes']],
+                         [Decimal("0.95"), Decimal("0.9"), Decimal("0.88")])
+
+        with self.assertNumQueries(0):
+            quotes = quote_index.best(eur.id, kabul.id, limit=1, highest=False)
+        self.assertEqual([quote['name'] for quote in quotes], ["Saraf2 Khan"])
+
+        # A base rate change reorders the quotes without a custom rate
+        with self.captureOnCommitCallbacks(execute=True):
+            eur.exchange_rate = Decimal("0.990000")
+            eur.save()
+        response = self.client.get('/api/quotes/best/', {'currency': 'EUR', 'province': 'Kabul', 'limit': 1})
+        self.assertEqual(response.data['province'], "Kabul")
+        self.assertEqual(response.data['quotes'][0]['name'], "Saraf1 Khan")
+        response = self.client.get('/api/quotes/best/', {'currency': 'EUR', 'limit': 1})
+        self.assertEqual(response.data['quotes'][0]['rate'], Decimal("0.99"))
+
+        self.assertEqual(self.client.get('/api/quotes/best/', {'currency': 'XXX'}).status_code, 400)
+        # Digits int() does not parse are looked up as codes / names, not taken for ids
+        self.assertEqual(self.client.get('/api/quotes/best/', {'currency': '²'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/quotes/best/', {'currency': 'EUR', 'province': '²'}).status_code, 400)
+
+        # Saves that leave the quoted fields alone keep the index
+        version = get_version('quotes')
+        with self.captureOnCommitCallbacks(execute=True):
+            saraf.save(update_fields=['saraf_logo'])
+        self.assertEqual(get_version('quotes'), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            saraf.exchange_name = "Khan Exchange"
+            saraf.save(update_fields=['exchange_name'])
+        self.assertNotEqual(get_version('quotes'), version)
@@ -2,6 +2,11 @@ from django.urls import path
 from . import views
 from .views import (
     sendhawalaAV, 
+    sendhawalaBulkCreateAV,
+    sendhawalaStatusAV,
+    sendhawalaBulkStatusAV,
+    sendhawalaExportAV,
+    HawalaDashboardTotalsAV,
     FilteredsendhawalaAV,
     SarafProfileCreateView,
     SarafProfileDetailView,
@@ -10,6 +15,9 @@ from .views import (
     SarafProfileDualLoginView,
     CurrencyListView,
     CurrencyDetailView,
+    CurrencyConvertView,
+    CurrencyCatalogueView,
+    BestQuotesView,
     ProvincesListView,
     ProvinceDetailView,
     SarafSupportedCurrenciesView,
@@ -37,6 +45,11 @@ from .views import (
 urlpatterns = [
     # Sendhawala endpoints
     path('sendhawala/', sendhawalaAV.as_view(), name='send-hawala-api'),
+    path('sendhawala/bulk/', sendhawalaBulkCreateAV.as_view(), name='send-hawala-bulk'),
+    path('sendhawala/<int:pk>/status/', sendhawalaStatusAV.as_view(), name='send-hawala-status'),
+    path('sendhawala/status/bulk/', sendhawalaBulkStatusAV.as_view(), name='send-hawala-bulk-status'),
+    path('sendhawala/export/', sendhawalaExportAV.as_view(), name='send-hawala-export'),
+    path('dashboard/hawala-totals/', HawalaDashboardTotalsAV.as_view(), name='hawala-dashboard-totals'),
     path('send-hawala/filter/', FilteredsendhawalaAV.as_view(), name='send-hawala-filter'),
     
     # SarafProfile endpoints
@@ -66,6 +79,9 @@ urlpatterns = [
     # Currency endpoints
     path('currencies/', CurrencyListView.as_view(), name='currency-list'),
     path('currencies/<int:currency_id>/', CurrencyDetailView.as_view(), name='currency-detail'),
+    path('currencies/convert/', CurrencyConvertView.as_view(), name='currency-convert'),
+    path('currencies/catalogue/', CurrencyCatalogueView.as_view(), name='currency-catalogue'),
+    path('quotes/best/', BestQuotesView.as_view(), name='best-quotes'),
 
     # Provinces
     path('provinces/', ProvincesListView.as_view(), name='province-list'),
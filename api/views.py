@@ -8,6 +8,10 @@ from django.contrib.sessions.models import Session
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import api_view, permission_classes
 from django.db import models
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.views.decorators.vary import vary_on_headers
 
 
 class IsOwnerOrReadOnly(BasePermission):
@@ -46,9 +50,23 @@ from Core.models import (
     Message, MessageAttachment, CustomerAccount, CustomerBalance,
     normal_user_Profile, SarafPost
 )
+from Core.catalogue import VERSION_NAME as CATALOGUE_VERSION, choose_encoding, get_catalogue, parse_field_sets
+from Core.conditional import versioned_condition
+from Core.currencies import currency_registry
+from Core.currency_utils import CONVERSION_ROUNDING, CurrencyConversionError, convert_many
+from Core.exports import EXPORT_FORMATS, export_queryset, iter_export
+from Core.name_search import name_query
+from Core.rollups import GROUPINGS, grouping, totals as hawala_totals
+from Core.provinces import province_index
+from Core.quotes import quote_index
+from Core.transitions import (
+    InvalidTransition, TransitionConflict, bulk_transition, bulk_transition_ids,
+    transition_hawala, verify_receive_hawala,
+)
 from django.core.exceptions import ValidationError as DjangoValidationError
 from .serializers import (
     sendhawalaSerializer, 
+    sendhawalaBulkSerializer,
     SarafProfileSerializer, 
     SarafProfileReadSerializer,
     SarafProfileLiteSerializer,
@@ -63,6 +81,7 @@ from .serializers import (
     CustomerFinancialOperationSerializer,
     NormalUserProfileLoginSerializer,
     CurrencySerializer,
+    CurrencyConversionSerializer,
     ProvinceSerializer,
     BalanceOperationInputSerializer,
     SupportedCurrencySerializer,
@@ -77,6 +96,7 @@ from .serializers import (
     CurrencyExchangeSerializer, CurrencyExchangeCreateSerializer,
     SarafPostSerializer,
 )
+from .pagination import KeysetPagination, PaginationError
 
 
 class sendhawalaAV(APIView):
@@ -88,9 +108,196 @@ class sendhawalaAV(APIView):
                 'error': 'Authentication required. Please login first.'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        hawalas = sendhawala.objects.all().order_by('-created_at')
-        serializer = sendhawalaSerializer(hawalas, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        hawalas = sendhawala.objects.select_related('currency', 'hawala_fee_currency')
+        paginator = KeysetPagination(id_field='send_hawala_id')
+        try:
+            page = paginator.paginate_queryset(hawalas, request)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = sendhawalaSerializer(page, many=True)
+        return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
+
+
+class sendhawalaBulkCreateAV(APIView):
+    def post(self, request):
+        """Create a batch of sendhawala records; invalid rows are reported without aborting the batch"""
+        if not request.session.get('is_authenticated'):
+            return Response({
+                'error': 'Authentication required. Please login first.'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+        serializer = sendhawalaBulkSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        created, errors = serializer.save()
+        response_status = status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': sendhawalaSerializer(created, many=True).data,
+            'errors': errors,
+        }, status=response_status)
+
+
+class sendhawalaStatusAV(APIView):
+    def post(self, request, pk):
+        """
+        Move a sendhawala to another status.
+        Body: {"status": "finished", "expected_status": "started" (optional)}
+        """
+        if not request.session.get('is_authenticated'):
+            return Response({
+                'error': 'Authentication required. Please login first.'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+        to_status = request.data.get('status')
+        if not to_status:
+            return Response({'error': 'status is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            previous_status = transition_hawala(pk, to_status, expected=request.data.get('expected_status'))
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except sendhawala.DoesNotExist:
+            return Response({'error': 'Sendhawala not found'}, status=status.HTTP_404_NOT_FOUND)
+        except TransitionConflict as e:
+            return Response({
+                'error': f'Cannot move hawala from {e.current_status} to {to_status}',
+                'status': e.current_status,
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'send_hawala_id': pk,
+            'previous_status': previous_status,
+            'status': to_status,
+        }, status=status.HTTP_200_OK)
+
+
+class sendhawalaBulkStatusAV(APIView):
+    def post(self, request):
+        """
+        Move many sendhawala records to another status at once.
+        Body: {"status": "finished", "ids": [1, 2, 3]} or {"status": "finished", "date": "2024-01-15"},
+        optionally with "expected_status". Hawalas that cannot move are reported as conflicts.
+        """
+        if not request.session.get('is_authenticated'):
+            return Response({
+                'error': 'Authentication required. Please login first.'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+        to_status = request.data.get('status')
+        ids = request.data.get('ids')
+        day = request.data.get('date')
+        expected = request.data.get('expected_status')
+        if not to_status:
+            return Response({'error': 'status is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if bool(ids) == bool(day):
+            return Response({'error': 'Provide either ids or date'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if ids:
+                if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+                    return Response({'error': 'ids must be a list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+                result = bulk_transition_ids(ids, to_status, expected=expected)
+            else:
+                try:
+                    day = parse_date(day)
+                except ValueError:
+                    day = None
+                if day is None:
+                    return Response({'error': 'date must be in YYYY-MM-DD format'}, status=status.HTTP_400_BAD_REQUEST)
+                result = bulk_transition(sendhawala.objects.filter(created_at__date=day), to_status, expected=expected)
+        except InvalidTransition as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(result.as_dict(), status=status.HTTP_200_OK)
+
+
+class sendhawalaExportAV(APIView):
+    CONTENT_TYPES = {
+        'csv': 'text/csv; charset=utf-8',
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request):
+        """
+        Stream sendhawala records with their receive details.
+        Query parameters: export_format (csv | ndjson), date_from, date_to (YYYY-MM-DD), status
+        """
+        if not request.session.get('is_authenticated'):
+            return Response({
+                'error': 'Authentication required. Please login first.'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return Response({
+                'error': f'Invalid export_format. Valid options are: {", ".join(EXPORT_FORMATS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        status_param = request.query_params.get('status')
+        valid_statuses = [choice[0] for choice in sendhawala.STATUS_CHOICES]
+        if status_param and status_param not in valid_statuses:
+            return Response({
+                'error': f'Invalid status. Valid options are: {", ".join(valid_statuses)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        dates = {}
+        for param in ('date_from', 'date_to'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    dates[param] = parse_date(value)
+                except ValueError:
+                    dates[param] = None
+                if dates[param] is None:
+                    return Response({
+                        'error': f'{param} must be in YYYY-MM-DD format'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = export_queryset(status=status_param, **dates)
+        response = StreamingHttpResponse(iter_export(rows, export_format),
+                                         content_type=self.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="hawalas.{export_format}"'
+        return response
+
+
+class HawalaDashboardTotalsAV(APIView):
+    def get(self, request):
+        """
+        Hawala totals read from the daily rollups.
+        Query parameters: group_by (comma separated, default "day,currency,status"), date_from, date_to, status
+        Rows are always split by currency and fee currency too, so amount_sum
+        and fee_sum never add up different currencies.
+        """
+        if not request.session.get('is_authenticated'):
+            return Response({
+                'error': 'Authentication required. Please login first.'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+
+        group_by = [name.strip() for name in request.query_params.get('group_by', 'day,currency,status').split(',') if name.strip()]
+        invalid = [name for name in group_by if name not in GROUPINGS]
+        if invalid or not group_by:
+            return Response({
+                'error': f'Invalid group_by. Valid options are: {", ".join(GROUPINGS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = {'status': request.query_params.get('status') or None}
+        for param in ('date_from', 'date_to'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    filters[param] = parse_date(value)
+                except ValueError:
+                    filters[param] = None
+                if filters[param] is None:
+                    return Response({
+                        'error': f'{param} must be in YYYY-MM-DD format'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'group_by': grouping(group_by),
+            'results': list(hawala_totals(group_by, **filters)),
+        }, status=status.HTTP_200_OK)
 
 
 # SarafPost Views
@@ -139,10 +346,10 @@ class FilteredsendhawalaAV(APIView):
             hawalas = hawalas.filter(status=status_param)
         
         if sender_name:
-            hawalas = hawalas.filter(sender_name__icontains=sender_name)
+            hawalas = hawalas.filter(name_query('sender', sender_name))
             
         if receiver_name:
-            hawalas = hawalas.filter(receiver_name__icontains=receiver_name)
+            hawalas = hawalas.filter(name_query('receiver', receiver_name))
             
         if hawala_number:
             try:
@@ -153,14 +360,27 @@ class FilteredsendhawalaAV(APIView):
                     'error': 'hawala_number must be a valid integer'
                 }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Order by creation date (newest first)
-        hawalas = hawalas.order_by('-created_at')
-        
-        serializer = sendhawalaSerializer(hawalas, many=True)
-        return Response({
-            'count': hawalas.count(),
-            'results': serializer.data
-        }, status=status.HTTP_200_OK)
+        # Province filters take a province id or name
+        for param in ('receiver_province', 'exchanger_province'):
+            value = request.query_params.get(param)
+            if value:
+                province = province_index.get(int(value)) if value.isdecimal() else province_index.resolve(value)
+                if province is None:
+                    return Response({
+                        'error': f'{param} must be an active province id or name'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                hawalas = hawalas.filter(**{param: province})
+        
+        # Newest first, one page at a time
+        hawalas = hawalas.select_related('currency', 'hawala_fee_currency')
+        paginator = KeysetPagination(id_field='send_hawala_id')
+        try:
+            page = paginator.paginate_queryset(hawalas, request)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = sendhawalaSerializer(page, many=True)
+        return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
 
 
 class SarafProfileCreateView(APIView):
@@ -297,6 +517,7 @@ class SarafProfileDetailView(APIView):
 
 
 # Currency Views
+@method_decorator(versioned_condition('currencies'), name='get')
 class CurrencyListView(APIView):
     permission_classes = [AllowAny]
 
@@ -306,15 +527,111 @@ class CurrencyListView(APIView):
         """
         code = request.query_params.get('code')
         symbol = request.query_params.get('symbol')
-        currencies = Currency.get_active_currencies()
+        currencies = currency_registry.active()
         if code:
-            currencies = currencies.filter(code__iexact=code)
+            currencies = [currency for currency in currencies if currency.code.lower() == code.lower()]
         if symbol:
-            currencies = currencies.filter(symbol=symbol)
+            currencies = [currency for currency in currencies if currency.symbol == symbol]
         serializer = CurrencySerializer(currencies, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+def catalogue_encoding(request):
+    return choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+
+
+# Vary outside the condition so 304 responses carry it too
+@method_decorator([vary_on_headers('Accept-Encoding'),
+                   versioned_condition(CATALOGUE_VERSION, variant=catalogue_encoding)], name='get')
+class CurrencyCatalogueView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Compact catalogue of the active currencies: {"fields": [...], "currencies": [[...], ...]}.
+        Select columns with ?fields=code,symbol,names,popular,default,id
+        (default code,symbol,names,popular). Served precompressed with gzip
+        (or brotli) when the client accepts it.
+        """
+        try:
+            field_sets = parse_field_sets(request.query_params.get('fields'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        encoding = catalogue_encoding(request)
+        response = HttpResponse(get_catalogue(field_sets)[encoding], content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return response
+
+
+class CurrencyConvertView(APIView):
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """
+        Convert a batch of amounts.
+        Body: {"conversions": [[amount, from_code, to_code], ...], "places": 2}
+        Results are rounded half up to `places` decimals, in request order.
+        """
+        serializer = CurrencyConversionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        places = serializer.validated_data['places']
+        try:
+            results = convert_many(serializer.validated_data['conversions'], places=places)
+        except CurrencyConversionError as e:
+            return Response({
+                'error': 'Some conversions failed',
+                'errors': [{'index': index, 'error': message} for index, message in sorted(e.errors.items())],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'results': [str(result) for result in results],
+            'places': places,
+            'rounding': CONVERSION_ROUNDING,
+        }, status=status.HTTP_200_OK)
+
+
+class BestQuotesView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """
+        Sarafs quoting the best effective rate for a currency.
+        Query parameters: currency (code or id, required), province (id or name),
+        limit (default 5, at most 50), order (high | low, default high)
+        """
+        value = request.query_params.get('currency', '')
+        currency = currency_registry.get(int(value)) if value.isdecimal() else currency_registry.by_code(value)
+        if currency is None or not currency.is_active:
+            return Response({'error': 'currency must be an active currency code or id'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        province = None
+        value = request.query_params.get('province')
+        if value:
+            province = province_index.get(int(value)) if value.isdecimal() else province_index.resolve(value)
+            if province is None:
+                return Response({'error': 'province must be an active province id or name'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), 50)
+        except ValueError:
+            return Response({'error': 'limit must be a valid integer'}, status=status.HTTP_400_BAD_REQUEST)
+        order = request.query_params.get('order', 'high')
+        if order not in ('high', 'low'):
+            return Response({'error': 'Invalid order. Valid options are: high, low'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        quotes = quote_index.best(currency.id, province.id if province else None, limit=limit,
+                                  highest=order == 'high')
+        return Response({
+            'currency': currency.code,
+            'province': province.name if province else None,
+            'quotes': quotes,
+        }, status=status.HTTP_200_OK)
+
+
 class CurrencyDetailView(APIView):
     permission_classes = [AllowAny]
 
@@ -330,6 +647,7 @@ class CurrencyDetailView(APIView):
             return Response({'error': 'Currency not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
+@method_decorator(versioned_condition('provinces'), name='get')
 class ProvincesListView(APIView):
     permission_classes = [AllowAny]
 
@@ -1246,7 +1564,9 @@ class ReceiveHawalaDetailView(APIView):
             }, status=status.HTTP_401_UNAUTHORIZED)
         
         try:
-            receive_hawala = ReceiveHawala.objects.get(id=pk)
+            receive_hawala = ReceiveHawala.objects.select_related(
+                *ReceiveHawalaSerializer.select_related_fields
+            ).get(id=pk)
             serializer = ReceiveHawalaSerializer(receive_hawala)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except ReceiveHawala.DoesNotExist:
@@ -1287,7 +1607,7 @@ class ReceiveHawalaListView(APIView):
                 'error': 'Authentication required. Please login first.'
             }, status=status.HTTP_401_UNAUTHORIZED)
         
-        queryset = ReceiveHawala.objects.all().select_related('sendhawala', 'verified_by')
+        queryset = ReceiveHawala.objects.select_related(*ReceiveHawalaSerializer.select_related_fields)
         
         # Optional filtering
         hawala_number = request.query_params.get('hawala_number')
@@ -1297,12 +1617,18 @@ class ReceiveHawalaListView(APIView):
         if hawala_number:
             queryset = queryset.filter(sendhawala__hawala_number=hawala_number)
         if receiver_name:
-            queryset = queryset.filter(sendhawala__receiver_name__icontains=receiver_name)
+            queryset = queryset.filter(name_query('receiver', receiver_name, hawala_ref='sendhawala_id'))
         if verified_by:
             queryset = queryset.filter(verified_by__saraf_id=verified_by)
         
-        serializer = ReceiveHawalaSerializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        try:
+            page = paginator.paginate_queryset(queryset, request)
+        except PaginationError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = ReceiveHawalaSerializer(page, many=True)
+        return Response(paginator.get_paginated_data(serializer.data), status=status.HTTP_200_OK)
 
 
 class ReceiveHawalaVerifyView(APIView):
@@ -1326,26 +1652,28 @@ class ReceiveHawalaVerifyView(APIView):
             }, status=status.HTTP_403_FORBIDDEN)
         
         try:
-            receive_hawala = ReceiveHawala.objects.get(id=pk)
-            saraf = SarafProfile.objects.get(saraf_id=saraf_id)
-            
-            # Set verification details
-            receive_hawala.verified_by = saraf
-            from django.utils import timezone
-            receive_hawala.verification_date = timezone.now()
-            receive_hawala.save()
-            
-            serializer = ReceiveHawalaSerializer(receive_hawala)
-            return Response({
-                'message': 'ReceiveHawala verified successfully', 
-                'verified_by': saraf.name, 
-                'verification_date': receive_hawala.verification_date
-            }, status=status.HTTP_200_OK)
-        except ReceiveHawala.DoesNotExist:
-            return Response({'error': 'ReceiveHawala not found'}, status=status.HTTP_404_NOT_FOUND)
+            saraf = SarafProfile.objects.only('saraf_id', 'name').get(saraf_id=saraf_id)
         except SarafProfile.DoesNotExist:
             return Response({'error': 'Saraf profile not found'}, status=status.HTTP_404_NOT_FOUND)
 
+        # Conditional UPDATE: only the first saraf to verify wins
+        verification_date = verify_receive_hawala(pk, saraf.saraf_id)
+        if verification_date is None:
+            verification = ReceiveHawala.objects.filter(id=pk).values('verified_by', 'verification_date').first()
+            if verification is None:
+                return Response({'error': 'ReceiveHawala not found'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({
+                'error': 'ReceiveHawala is already verified',
+                'verified_by': verification['verified_by'],
+                'verification_date': verification['verification_date'],
+            }, status=status.HTTP_409_CONFLICT)
+
+        return Response({
+            'message': 'ReceiveHawala verified successfully', 
+            'verified_by': saraf.name, 
+            'verification_date': verification_date
+        }, status=status.HTTP_200_OK)
+
 
 # CustomerAccount API Views
 class CustomerAccountCreateView(APIView):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CurrencyRate
+from .models import CurrencyRate, CurrencyRateBar, LatestCurrencyRate
 
 
 @admin.register(CurrencyRate)
@@ -21,3 +21,48 @@ class CurrencyRateAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(LatestCurrencyRate)
+class LatestCurrencyRateAdmin(admin.ModelAdmin):
+    list_display = (
+        "currency_code",
+        "rate",
+        "base_currency",
+        "bank_name",
+        "date_fetched",
+    )
+    list_filter = ("bank_name",)
+    search_fields = ("currency_code", "bank_name")
+    ordering = ("currency_code",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(CurrencyRateBar)
+class CurrencyRateBarAdmin(admin.ModelAdmin):
+    list_display = (
+        "currency_code",
+        "interval",
+        "period_start",
+        "open",
+        "high",
+        "low",
+        "close",
+        "sample_count",
+        "bank_name",
+    )
+    list_filter = ("interval", "bank_name")
+    search_fields = ("currency_code",)
+    date_hierarchy = "period_start"
+    ordering = ("-period_start",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
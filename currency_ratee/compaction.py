@@ -0,0 +1,140 @@
+"""
+Downsampling and retention of the raw CurrencyRate history.
+
+Closed hours of raw points are rolled into hourly OHLC bars per bank and
+currency, hourly bars into daily bars, and raw points older than the
+retention window (and already compacted) are deleted in bounded batches.
+Since ingestion only stores changed rates, hours without a change have no
+bar; the previous close still applies.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .ingest import bulk_upsert
+from .models import CurrencyRate, CurrencyRateBar
+
+HOUR = 'hour'
+DAY = 'day'
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'sample_count']
+# Completed bars kept in memory before they are written
+FLUSH_SIZE = 2000
+
+
+def hour_start(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def day_start(moment):
+    return timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _merge(bars, key, open_, high, low, close, count):
+    """Fold a point (or a smaller bar) into bars[key]; points must arrive in time order"""
+    bar = bars.get(key)
+    if bar is None:
+        bars[key] = [open_, high, low, close, count]
+    else:
+        bar[1] = max(bar[1], high)
+        bar[2] = min(bar[2], low)
+        bar[3] = close
+        bar[4] += count
+
+
+def _write_bars(interval, bars):
+    bulk_upsert(
+        CurrencyRateBar,
+        [
+            CurrencyRateBar(bank_name=bank_name, currency_code=currency_code, interval=interval,
+                            period_start=period_start, open=open_, high=high, low=low, close=close,
+                            sample_count=count)
+            for (bank_name, currency_code, period_start), (open_, high, low, close, count) in bars.items()
+        ],
+        unique_fields=['bank_name', 'currency_code', 'interval', 'period_start'],
+        update_fields=BAR_FIELDS,
+    )
+
+
+def compact_hours(until=None):
+    """
+    Roll raw points of the closed hours not compacted yet into hourly bars.
+    Returns the set of local days that received bars.
+    """
+    until = hour_start(until or timezone.now())
+    last_bar = CurrencyRateBar.objects.filter(interval=HOUR).aggregate(last=Max('period_start'))['last']
+    points = CurrencyRate.objects.filter(date_fetched__lt=until)
+    if last_bar is not None:
+        points = points.filter(date_fetched__gte=last_bar + timedelta(hours=1))
+    points = points.order_by('bank_name', 'currency_code', 'date_fetched', 'id').values_list(
+        'bank_name', 'currency_code', 'date_fetched', 'rate'
+    )
+
+    days = set()
+    bars = {}
+    for bank_name, currency_code, fetched_at, rate in points.iterator(chunk_size=5000):
+        key = (bank_name, currency_code, hour_start(fetched_at))
+        if key not in bars and len(bars) >= FLUSH_SIZE:
+            # Points are ordered per series, so every bar collected so far is complete
+            _write_bars(HOUR, bars)
+            days.update(day_start(period_start) for _, _, period_start in bars)
+            bars = {}
+        _merge(bars, key, rate, rate, rate, rate, 1)
+    if bars:
+        _write_bars(HOUR, bars)
+        days.update(day_start(period_start) for _, _, period_start in bars)
+    return days
+
+
+def compact_days(days):
+    """(Re)build the daily bars of the given local days from their hourly bars"""
+    bars = {}
+    for first_day in sorted(days):
+        hours = (
+            CurrencyRateBar.objects
+            .filter(interval=HOUR, period_start__gte=first_day, period_start__lt=first_day + timedelta(days=1))
+            .order_by('bank_name', 'currency_code', 'period_start')
+            .values_list('bank_name', 'currency_code', *BAR_FIELDS)
+        )
+        for bank_name, currency_code, open_, high, low, close, count in hours:
+            _merge(bars, (bank_name, currency_code, first_day), open_, high, low, close, count)
+    if bars:
+        _write_bars(DAY, bars)
+    return len(bars)
+
+
+def prune_raw_rates(retention_days=None, batch_size=None):
+    """
+    Delete raw points older than the retention window that are already
+    covered by hourly bars, `batch_size` rows per statement. Returns the
+    number of deleted rows.
+    """
+    if retention_days is None:
+        retention_days = settings.CURRENCY_RATE_RETENTION_DAYS
+    batch_size = batch_size or settings.CURRENCY_RATE_PRUNE_BATCH_SIZE
+
+    last_bar = CurrencyRateBar.objects.filter(interval=HOUR).aggregate(last=Max('period_start'))['last']
+    if last_bar is None:
+        return 0
+    cutoff = min(timezone.now() - timedelta(days=retention_days), last_bar + timedelta(hours=1))
+
+    expired = CurrencyRate.objects.filter(date_fetched__lt=cutoff).order_by('id').values_list('id', flat=True)
+    deleted = 0
+    while True:
+        ids = list(expired[:batch_size])
+        if not ids:
+            return deleted
+        # Each batch is its own short transaction so the table is never locked for long
+        with transaction.atomic():
+            deleted += CurrencyRate.objects.filter(id__in=ids).delete()[0]
+
+
+def compact_rates(prune=True, retention_days=None, batch_size=None):
+    """Run a compaction pass; returns (days compacted, daily bars written, raw rows deleted)"""
+    with transaction.atomic():
+        days = compact_hours()
+        daily_bars = compact_days(days)
+    deleted = prune_raw_rates(retention_days, batch_size) if prune else 0
+    return len(days), daily_bars, deleted
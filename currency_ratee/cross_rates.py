@@ -0,0 +1,40 @@
+"""
+Cross rates between every pair of quoted currencies.
+
+Rates are stored as base currency (AFN) per unit of a currency, so one unit
+of A buys rate[A] / rate[B] units of B. The full matrix is built once per
+rates version (see views.rate_payloads) and every pair lookup reads it.
+"""
+SIGNIFICANT_DIGITS = 8
+
+
+def _round(value):
+    return float(f'{value:.{SIGNIFICANT_DIGITS}g}')
+
+
+def build_cross_rates(latest, base_currency):
+    """
+    Compact matrix payload from the latest rate per currency quoted in
+    `base_currency` (rates in other bases are left out):
+    rates[i][j] is how many units of currencies[j] one unit of currencies[i] buys.
+    """
+    latest = [rate for rate in latest if rate.base_currency == base_currency]
+    per_unit = {rate.currency_code: rate.rate for rate in latest if rate.rate > 0}
+    per_unit.setdefault(base_currency, 1)
+    codes = sorted(per_unit)
+    values = [float(per_unit[code]) for code in codes]
+    inverse = [1 / value for value in values]
+    return {
+        'base_currency': base_currency,
+        'as_of': max((rate.date_fetched for rate in latest), default=None),
+        'currencies': codes,
+        'rates': [[_round(value * other) for other in inverse] for value in values],
+    }
+
+
+def cross_rate(matrix, from_code, to_code):
+    """Units of `to_code` per unit of `from_code` from a build_cross_rates payload, or None"""
+    codes = matrix['currencies']
+    if from_code not in codes or to_code not in codes:
+        return None
+    return matrix['rates'][codes.index(from_code)][codes.index(to_code)]
@@ -0,0 +1,181 @@
+"""
+Concurrent fetching of rates from every configured BankFX source.
+
+All sources are polled in parallel threads over one pooled keep-alive
+requests session with connect / read timeouts and retry with backoff. A
+source that keeps failing is skipped by its circuit breaker for a cooldown
+so it cannot slow down every beat cycle. Fetched rates are stored from the
+calling thread, one source at a time (ingest.store_rates), and then copied
+into Core.Currency.exchange_rate.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .ingest import store_rates, sync_exchange_rates
+
+
+class RateFetchError(Exception):
+    """The rate API could not be reached or did not return success"""
+
+
+class PooledSession:
+    """requests.Session with a connection pool sized for the fetcher threads, built on first use"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+
+    def get(self):
+        with self._lock:
+            if self._session is None:
+                retry = Retry(
+                    total=settings.CURRENCY_RATE_FETCH_RETRIES,
+                    backoff_factor=settings.CURRENCY_RATE_FETCH_BACKOFF,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=('GET',),
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.CURRENCY_RATE_FETCH_WORKERS,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def clear(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+
+http_session = PooledSession()
+
+
+class CircuitBreaker:
+    """
+    Per source failure counter. After `threshold` consecutive failures the
+    source is open (skipped) for `cooldown` seconds, then one trial fetch is
+    let through; its failure opens the circuit again.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                # Half open: the next failure re-opens it right away
+                self._opened_at = None
+                self._failures = self.threshold - 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per source, kept in process memory"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, source):
+        with self._lock:
+            if source not in self._breakers:
+                self._breakers[source] = CircuitBreaker(settings.CURRENCY_RATE_BREAKER_THRESHOLD,
+                                                        settings.CURRENCY_RATE_BREAKER_COOLDOWN)
+            return self._breakers[source]
+
+    def clear(self):
+        with self._lock:
+            self._breakers = {}
+
+
+circuit_breakers = CircuitBreakers()
+
+
+def fetch_bankfx_rates(bank_code='AFCB', timeout=None):
+    """Return (meta, rates) from the BankFX bank endpoint"""
+    url = f"{settings.BANKFX_BASE_URL}/bank/{bank_code}"
+    timeout = timeout or (settings.CURRENCY_RATE_CONNECT_TIMEOUT, settings.CURRENCY_RATE_READ_TIMEOUT)
+    try:
+        response = http_session.get().get(url, params={'api_key': settings.BANKFX_API_KEY}, timeout=timeout)
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        raise RateFetchError(str(e))
+    if data.get("code") != 200:
+        raise RateFetchError("API did not return success.")
+    return data.get("meta", {}), data.get("rates", {})
+
+
+def _fetch_source(source):
+    breaker = circuit_breakers.get(source)
+    if not breaker.allow():
+        raise RateFetchError("Circuit open, source skipped.")
+    try:
+        result = fetch_bankfx_rates(source)
+    except RateFetchError:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def fetch_all_rates(sources=None):
+    """
+    Fetch every source concurrently. Returns {source: (meta, rates)} for the
+    sources that answered and {source: error message} for the others.
+    """
+    sources = list(sources or settings.CURRENCY_RATE_SOURCES)
+    fetched, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(len(sources), settings.CURRENCY_RATE_FETCH_WORKERS))) as pool:
+        futures = {source: pool.submit(_fetch_source, source) for source in sources}
+    for source, future in futures.items():
+        try:
+            fetched[source] = future.result()
+        except RateFetchError as e:
+            errors[source] = str(e)
+    return fetched, errors
+
+
+def fetch_and_store_rates(sources=None):
+    """
+    Fetch all sources and store what came back. Returns (changed rates per
+    source, error per failed source); raises RateFetchError if none answered.
+    """
+    fetched, errors = fetch_all_rates(sources)
+    if not fetched:
+        raise RateFetchError("; ".join(f"{source}: {error}" for source, error in errors.items())
+                             or "No rate sources configured.")
+    changed = {source: store_rates(meta, rates) for source, (meta, rates) in fetched.items()}
+    if any(changed.values()):
+        sync_exchange_rates()
+    return changed, errors
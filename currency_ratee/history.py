@@ -0,0 +1,125 @@
+"""
+Time range reads of one currency's rate history in columnar form.
+
+Raw points come from CurrencyRate through its (currency_code, date_fetched)
+index. Hourly / daily series come from CurrencyRateBar; the hours that are
+not compacted yet are aggregated from the raw points on the fly so the
+series always reaches the latest fetch.
+
+Only changes are stored, so a rate holds until the next point. Every series
+therefore starts from the rate known before the range: raw series with the
+last point before it, bar series with a flat bar (count 0) in their first
+period when that period saw no change.
+"""
+from datetime import timedelta
+
+from django.db.models import Max
+
+from .compaction import DAY, HOUR, _merge, day_start, hour_start
+from .models import CurrencyRate, CurrencyRateBar
+
+RAW = 'raw'
+INTERVALS = [RAW, HOUR, DAY]
+
+
+def default_interval(date_from, date_to):
+    """Coarsest-needed interval for a range, so a chart gets a few hundred points at most"""
+    span = date_to - date_from
+    if span <= timedelta(days=2):
+        return RAW
+    if span <= timedelta(days=31):
+        return HOUR
+    return DAY
+
+
+def _timestamp(moment):
+    return int(moment.timestamp())
+
+
+def period_floor(interval, moment):
+    return hour_start(moment) if interval == HOUR else day_start(moment)
+
+
+def _raw_points(currency_code, bank_name, date_from, date_to):
+    return (
+        CurrencyRate.objects
+        .filter(currency_code=currency_code, bank_name=bank_name,
+                date_fetched__gte=date_from, date_fetched__lt=date_to)
+        .order_by('date_fetched', 'id')
+        .values_list('date_fetched', 'rate')
+    )
+
+
+def _rate_before(currency_code, bank_name, moment):
+    """(time, rate) in force just before `moment`: the last raw point, or the last bar close once pruned; or None"""
+    point = (
+        CurrencyRate.objects
+        .filter(currency_code=currency_code, bank_name=bank_name, date_fetched__lt=moment)
+        .order_by('-date_fetched', '-id')
+        .values_list('date_fetched', 'rate')
+        .first()
+    )
+    if point is not None:
+        return point
+    # Raw points are pruned oldest first, so without one only bars are left
+    return (
+        CurrencyRateBar.objects
+        .filter(currency_code=currency_code, bank_name=bank_name, interval=HOUR,
+                period_start__lte=moment - timedelta(hours=1))
+        .order_by('-period_start')
+        .values_list('period_start', 'close')
+        .first()
+    )
+
+
+def _bars(currency_code, bank_name, interval, date_from, date_to):
+    """{period_start: [open, high, low, close, count]} of the range, including uncompacted hours"""
+    bars = {}
+    stored = (
+        CurrencyRateBar.objects
+        .filter(currency_code=currency_code, bank_name=bank_name, interval=interval,
+                period_start__gte=period_floor(interval, date_from), period_start__lt=date_to)
+        .order_by('period_start')
+        .values_list('period_start', 'open', 'high', 'low', 'close', 'sample_count')
+    )
+    for period_start, *bar in stored:
+        bars[period_start] = bar
+
+    last_hour = (
+        CurrencyRateBar.objects
+        .filter(currency_code=currency_code, bank_name=bank_name, interval=HOUR)
+        .aggregate(last=Max('period_start'))['last']
+    )
+    tail_from = max(date_from, last_hour + timedelta(hours=1)) if last_hour else date_from
+    if tail_from < date_to:
+        for fetched_at, rate in _raw_points(currency_code, bank_name, tail_from, date_to):
+            _merge(bars, period_floor(interval, fetched_at), rate, rate, rate, rate, 1)
+    return bars
+
+
+def rate_history(currency_code, bank_name, date_from, date_to, interval):
+    """
+    Columnar history of a bank's rate for a currency in [date_from, date_to),
+    seeded with the rate in force at date_from: timestamps are epoch seconds,
+    values are floats, one array per column.
+    """
+    history = {'currency_code': currency_code, 'bank_name': bank_name, 'interval': interval}
+    previous = _rate_before(currency_code, bank_name, date_from)
+    if interval == RAW:
+        points = list(_raw_points(currency_code, bank_name, date_from, date_to))
+        if previous is not None:
+            points.insert(0, previous)
+        history['t'] = [_timestamp(fetched_at) for fetched_at, _ in points]
+        history['rate'] = [float(rate) for _, rate in points]
+        return history
+
+    bars = _bars(currency_code, bank_name, interval, date_from, date_to)
+    first_period = period_floor(interval, date_from)
+    if previous is not None and first_period not in bars:
+        bars[first_period] = [previous[1]] * 4 + [0]
+    bars = sorted(bars.items())
+    history['t'] = [_timestamp(period_start) for period_start, _ in bars]
+    for position, column in enumerate(['open', 'high', 'low', 'close']):
+        history[column] = [float(bar[position]) for _, bar in bars]
+    history['count'] = [bar[4] for _, bar in bars]
+    return history
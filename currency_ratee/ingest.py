@@ -0,0 +1,148 @@
+"""
+Storing fetched BankFX rates (see fetchers for the fetching), shared by the
+Celery task and the fetch_rates management command.
+"""
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+
+from Core.cache_utils import bump_version_on_commit, get_version
+from Core.currency_utils import update_exchange_rates
+
+from .models import CurrencyRate, LatestCurrencyRate
+
+RATES_VERSION = 'rates'
+
+
+RATE_PLACES = Decimal('0.000001')
+
+
+class KnownRates:
+    """
+    Last stored rate per (bank, currency) kept in process memory, loaded from
+    the LatestCurrencyRate snapshot. It is reloaded whenever the rates version
+    moved, so rates stored by other processes (Celery children, the fetch_rates
+    command) are compared against too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rates = None
+        self._version = None
+
+    def get(self):
+        # Read before loading: a bump racing the load causes another reload
+        version = get_version(RATES_VERSION)
+        with self._lock:
+            if self._rates is None or version != self._version:
+                self._version = version
+                self._rates = {
+                    (bank_name, code): (rate, base_currency, country_code)
+                    for bank_name, code, rate, base_currency, country_code in LatestCurrencyRate.objects.values_list(
+                        'bank_name', 'currency_code', 'rate', 'base_currency', 'country_code'
+                    )
+                }
+            return dict(self._rates)
+
+    def clear(self):
+        with self._lock:
+            self._rates = None
+
+
+known_rates = KnownRates()
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields):
+    """
+    Insert rows, updating `update_fields` of those clashing on `unique_fields`.
+    MySQL takes no conflict target (ON DUPLICATE KEY UPDATE covers every
+    unique key), so `unique_fields` is only passed to backends that use one.
+    """
+    options = dict(update_conflicts=True, update_fields=update_fields)
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = unique_fields
+    return model.objects.bulk_create(objs, **options)
+
+
+def preferred_first(snapshot):
+    """
+    Order LatestCurrencyRate rows so that, per currency, the preferred bank
+    comes first: banks in CURRENCY_RATE_SOURCES order, then unlisted banks by
+    their last change. Heartbeats (last_checked) never change the winner,
+    so it only moves with a rates version bump.
+    """
+    sources = list(settings.CURRENCY_RATE_SOURCES)
+    priority = Case(
+        *[When(bank_name=source, then=Value(position)) for position, source in enumerate(sources)],
+        default=Value(len(sources)),
+        output_field=IntegerField(),
+    )
+    return snapshot.order_by('currency_code', priority, '-date_fetched', 'bank_name')
+
+
+def store_rates(meta, rates):
+    """
+    Store a fetch. Only rates that differ from the last known rate are
+    appended to the CurrencyRate history and upserted into the
+    LatestCurrencyRate snapshot; the unchanged ones just get their
+    last_checked heartbeat moved. Returns the number of changed rates.
+    """
+    fetched_at = timezone.now()
+    common = dict(
+        base_currency=meta.get("base_currency", settings.CURRENCY_RATE_BASE),
+        bank_name=meta.get("bank_name", ""),
+        country_code=meta.get("country_code", ""),
+    )
+    known = known_rates.get()
+    changed = {}
+    unchanged = []
+    for code, rate in rates.items():
+        rate = Decimal(str(rate)).quantize(RATE_PLACES)
+        value = (rate, common['base_currency'], common['country_code'])
+        if known.get((common['bank_name'], code)) == value:
+            unchanged.append(code)
+        else:
+            changed[(common['bank_name'], code)] = value
+
+    with transaction.atomic():
+        if changed:
+            CurrencyRate.objects.bulk_create([
+                CurrencyRate(currency_code=code, rate=rate, **common)
+                for (_, code), (rate, _, _) in changed.items()
+            ])
+            bulk_upsert(
+                LatestCurrencyRate,
+                [
+                    LatestCurrencyRate(currency_code=code, rate=rate, date_fetched=fetched_at,
+                                       last_checked=fetched_at, **common)
+                    for (_, code), (rate, _, _) in changed.items()
+                ],
+                unique_fields=['bank_name', 'currency_code'],
+                update_fields=['rate', 'base_currency', 'country_code', 'date_fetched', 'last_checked'],
+            )
+            # Cached rate responses and known_rates are keyed by this version
+            bump_version_on_commit(RATES_VERSION)
+        if unchanged:
+            LatestCurrencyRate.objects.filter(
+                bank_name=common['bank_name'], currency_code__in=unchanged
+            ).update(last_checked=fetched_at)
+    return len(changed)
+
+
+def sync_exchange_rates(base_currency=None):
+    """
+    Copy the latest rate per currency (preferred bank, see preferred_first)
+    into Core.Currency.exchange_rate. Only rates quoted in `base_currency`
+    (CURRENCY_RATE_BASE by default) are used, so sources quoting other bases
+    are never mixed in. Returns the number of updated currencies.
+    """
+    base_currency = base_currency or settings.CURRENCY_RATE_BASE
+    rates = {}
+    snapshot = preferred_first(LatestCurrencyRate.objects.filter(base_currency=base_currency))
+    for code, rate in snapshot.values_list('currency_code', 'rate'):
+        rates.setdefault(code, rate)
+    return update_exchange_rates(rates, base_currency)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from currency_ratee.compaction import compact_rates
+
+
+class Command(BaseCommand):
+    help = "Roll raw currency rates into hourly / daily bars and prune old raw rates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int,
+                            help='Keep raw rates this many days (default: CURRENCY_RATE_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int,
+                            help='Rows deleted per statement (default: CURRENCY_RATE_PRUNE_BATCH_SIZE)')
+        parser.add_argument('--no-prune', action='store_true', help='Only compact, keep all raw rates')
+
+    def handle(self, *args, **options):
+        days, daily_bars, deleted = compact_rates(
+            prune=not options['no_prune'],
+            retention_days=options['retention_days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Compacted {days} day(s) into {daily_bars} daily bar(s), pruned {deleted} raw rate(s)"
+        ))
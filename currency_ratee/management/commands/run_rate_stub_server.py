@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from currency_ratee.stub_server import DEFAULT_BANKS, StubRateServer
+
+
+class Command(BaseCommand):
+    help = "Serve a local stub of the BankFX rate API for offline development"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--banks', default=','.join(DEFAULT_BANKS), help='Comma separated bank codes')
+        parser.add_argument('--delay', type=float, default=0, help='Seconds every response is held back')
+        parser.add_argument('--drift', type=float, default=0.001,
+                            help='Largest relative rate change per request (0 keeps rates fixed)')
+        parser.add_argument('--fail', default='', help='Comma separated bank codes answering 503')
+
+    def handle(self, *args, **options):
+        server = StubRateServer(
+            host=options['host'], port=options['port'],
+            banks=[bank.strip().upper() for bank in options['banks'].split(',') if bank.strip()],
+            delay=options['delay'], drift=options['drift'],
+            failing=[bank.strip().upper() for bank in options['fail'].split(',') if bank.strip()],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stub rate server on {server.url}; set BANKFX_BASE_URL={server.url} "
+            f"and CURRENCY_RATE_SOURCES={','.join(server.banks)}"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.httpd.server_close()
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency_ratee', '0002_alter_currencyrate_bank_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestCurrencyRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency_code', models.CharField(max_length=10)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('base_currency', models.CharField(max_length=10)),
+                ('bank_name', models.CharField(max_length=100)),
+                ('country_code', models.CharField(max_length=10)),
+                ('date_fetched', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['currency_code', 'date_fetched'], name='latest_rate_currency_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bank_name', 'currency_code'), name='latest_rate_bank_currency_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def backfill_latest_rates(apps, schema_editor):
+    CurrencyRate = apps.get_model('currency_ratee', 'CurrencyRate')
+    LatestCurrencyRate = apps.get_model('currency_ratee', 'LatestCurrencyRate')
+
+    # History rows are append only, so the highest id per pair is the latest rate
+    latest_ids = (
+        CurrencyRate.objects.values('bank_name', 'currency_code')
+        .annotate(latest_id=Max('id'))
+        .values_list('latest_id', flat=True)
+    )
+    LatestCurrencyRate.objects.bulk_create(
+        [
+            LatestCurrencyRate(
+                currency_code=rate.currency_code,
+                rate=rate.rate,
+                base_currency=rate.base_currency,
+                bank_name=rate.bank_name,
+                country_code=rate.country_code,
+                date_fetched=rate.date_fetched,
+            )
+            for rate in CurrencyRate.objects.filter(id__in=list(latest_ids))
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency_ratee', '0003_latestcurrencyrate'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_latest_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency_ratee', '0004_backfill_latest_rates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='latestcurrencyrate',
+            name='last_checked',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
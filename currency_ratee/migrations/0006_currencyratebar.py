@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency_ratee', '0005_latestcurrencyrate_last_checked'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrencyRateBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bank_name', models.CharField(max_length=100)),
+                ('currency_code', models.CharField(max_length=10)),
+                ('interval', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('period_start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('high', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('low', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('close', models.DecimalField(decimal_places=6, max_digits=20)),
+                ('sample_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['currency_code', 'interval', 'period_start'], name='rate_bar_currency_idx')],
+                'constraints': [models.UniqueConstraint(fields=('bank_name', 'currency_code', 'interval', 'period_start'), name='rate_bar_period_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('currency_ratee', '0006_currencyratebar'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='currencyrate',
+            index=models.Index(fields=['currency_code', 'date_fetched'], name='rate_currency_fetched_idx'),
+        ),
+    ]
@@ -8,5 +8,64 @@ class CurrencyRate(models.Model):
     country_code = models.CharField(max_length=10)
     date_fetched = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['currency_code', 'date_fetched'], name='rate_currency_fetched_idx'),
+        ]
+
     def __str__(self):
         return f"{self.currency_code} - {self.rate}"
+
+
+class LatestCurrencyRate(models.Model):
+    """Most recent rate per bank and currency, upserted on every fetch"""
+    currency_code = models.CharField(max_length=10)
+    rate = models.DecimalField(max_digits=20, decimal_places=6)
+    base_currency = models.CharField(max_length=10)
+    bank_name = models.CharField(max_length=100)
+    country_code = models.CharField(max_length=10)
+    # When the current rate was first fetched
+    date_fetched = models.DateTimeField()
+    # Last fetch that returned this rate unchanged
+    last_checked = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bank_name', 'currency_code'], name='latest_rate_bank_currency_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['currency_code', 'date_fetched'], name='latest_rate_currency_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.bank_name} {self.currency_code} - {self.rate}"
+
+
+class CurrencyRateBar(models.Model):
+    """Open / high / low / close of the raw CurrencyRate points in an hour or a day"""
+    INTERVAL_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+
+    bank_name = models.CharField(max_length=100)
+    currency_code = models.CharField(max_length=10)
+    interval = models.CharField(max_length=4, choices=INTERVAL_CHOICES)
+    period_start = models.DateTimeField()
+    open = models.DecimalField(max_digits=20, decimal_places=6)
+    high = models.DecimalField(max_digits=20, decimal_places=6)
+    low = models.DecimalField(max_digits=20, decimal_places=6)
+    close = models.DecimalField(max_digits=20, decimal_places=6)
+    sample_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bank_name', 'currency_code', 'interval', 'period_start'],
+                                    name='rate_bar_period_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['currency_code', 'interval', 'period_start'], name='rate_bar_currency_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency_code} {self.interval} {self.period_start:%Y-%m-%d %H:%M} - {self.close}"
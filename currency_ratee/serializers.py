@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CurrencyRate
+from .models import CurrencyRate, LatestCurrencyRate
 
 
 class CurrencyRateSerializer(serializers.ModelSerializer):
@@ -14,3 +14,8 @@ class CurrencyRateSerializer(serializers.ModelSerializer):
             'date_fetched'
         ]
         read_only_fields = ['date_fetched']
+
+
+class LatestCurrencyRateSerializer(CurrencyRateSerializer):
+    class Meta(CurrencyRateSerializer.Meta):
+        model = LatestCurrencyRate
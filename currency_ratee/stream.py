@@ -0,0 +1,149 @@
+"""
+Server-Sent Events stream of latest rate changes.
+
+One RateBroadcaster per process watches the rates version (bumped by every
+fetch that changed a rate) and pushes only the currencies whose entry in the
+all_latest_rates payload changed to every subscriber. Subscribers get the
+full payload as a snapshot when they connect. Needs the ASGI app
+(final_amu_pay.asgi, e.g. `uvicorn final_amu_pay.asgi:application`): under
+WSGI an endless stream would hold a worker thread per client, so the
+endpoint answers 503 there. Version bumps of the fetch task reach it through
+the shared CACHES backend.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+
+from Core.cache_utils import get_version
+
+from .ingest import RATES_VERSION
+from .views import build_latest_rates_payload, rate_payloads
+
+logger = logging.getLogger(__name__)
+
+
+def _latest_rates():
+    """(version, {currency code: rate info}) of the cached all_latest_rates payload"""
+    version = get_version(RATES_VERSION)
+    return version, rate_payloads.get('latest', build_latest_rates_payload)['rates']
+
+
+class Subscriber:
+    """Changes not yet sent to one client; newer changes of a currency replace older ones"""
+
+    def __init__(self):
+        self.pending = {}
+        self.version = None
+        self._ready = asyncio.Event()
+
+    def push(self, version, changes):
+        self.pending.update(changes)
+        self.version = version
+        self._ready.set()
+
+    async def next_changes(self, timeout):
+        """Wait up to `timeout` seconds; returns (version, changes) or None"""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._ready.clear()
+        changes, self.pending = self.pending, {}
+        return self.version, changes
+
+
+class RateBroadcaster:
+    """
+    Polls the rates version every RATE_STREAM_POLL_INTERVAL seconds while
+    anyone is subscribed, so the database is read once per change instead of
+    once per client poll.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._version = None
+        self._rates = None
+        self._task = None
+
+    async def _refresh(self):
+        """Reload the rates if the version moved; returns the changed entries"""
+        version = await sync_to_async(get_version)(RATES_VERSION)
+        if version == self._version and self._rates is not None:
+            return {}
+        version, rates = await sync_to_async(_latest_rates)()
+        previous = self._rates or {}
+        changes = {code: info for code, info in rates.items() if previous.get(code) != info}
+        self._version, self._rates = version, rates
+        return changes
+
+    async def _poll(self):
+        changes = await self._refresh()
+        if changes:
+            for subscriber in list(self._subscribers):
+                subscriber.push(self._version, changes)
+
+    async def _run(self):
+        while self._subscribers:
+            await asyncio.sleep(settings.RATE_STREAM_POLL_INTERVAL)
+            try:
+                await self._poll()
+            except Exception:
+                # A cache or database error must not stop updates for everyone connected
+                logger.exception("Rate stream poll failed, retrying")
+
+    async def subscribe(self):
+        """Register a client; returns (subscriber, version, snapshot of all rates)"""
+        await self._poll()
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._task = asyncio.create_task(self._run())
+        return subscriber, self._version, self._rates
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+
+rate_broadcaster = RateBroadcaster()
+
+
+def format_event(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def rate_events():
+    """SSE messages for one client: a snapshot, then only the changed currencies"""
+    subscriber, version, rates = await rate_broadcaster.subscribe()
+    try:
+        yield format_event('snapshot', rates, version)
+        while True:
+            update = await subscriber.next_changes(settings.RATE_STREAM_KEEPALIVE)
+            if update is None:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+            else:
+                yield format_event('rates', update[1], update[0])
+    finally:
+        rate_broadcaster.unsubscribe(subscriber)
+
+
+async def rate_stream(request):
+    """GET /api/currency/stream/ - text/event-stream of rate changes (ASGI only)"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The rate stream needs the ASGI server (final_amu_pay.asgi)'},
+                            status=503)
+    response = StreamingHttpResponse(rate_events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,108 @@
+"""
+Local stand-in for the BankFX API, for running the rate pipeline offline.
+
+Serves ``GET /bank/<code>`` in the BankFX response format. Point
+BANKFX_BASE_URL at it (``python manage.py run_rate_stub_server`` prints the
+URL), or start a StubRateServer in a background thread from tests.
+"""
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# AFN per unit of the currency
+DEFAULT_RATES = {
+    'USD': '70.500000', 'EUR': '76.200000', 'GBP': '89.100000', 'AED': '19.190000',
+    'PKR': '0.250000', 'IRR': '0.001670', 'INR': '0.840000', 'SAR': '18.790000',
+    'TRY': '2.150000', 'CNY': '9.720000',
+}
+DEFAULT_BANKS = ['AFCB', 'AIB', 'AUB', 'MAIB']
+
+
+class StubRateServer:
+    """
+    BankFX stub on localhost. `failing` banks answer 503, every response is
+    held back `delay` seconds and, with `drift`, each request moves every
+    rate by up to that fraction so consecutive fetches see changes.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, banks=None, rates=None, delay=0, drift=0, failing=()):
+        self.banks = list(banks or DEFAULT_BANKS)
+        self.rates = {bank: {code: Decimal(rate) for code, rate in (rates or DEFAULT_RATES).items()}
+                      for bank in self.banks}
+        self.delay = delay
+        self.drift = drift
+        self.failing = set(failing)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def payload(self, bank):
+        """(HTTP status, body) of a bank request"""
+        with self._lock:
+            self.requests += 1
+            if bank in self.failing:
+                return 503, {'code': 503, 'message': 'Service unavailable'}
+            if bank not in self.rates:
+                return 404, {'code': 404, 'message': f'Unknown bank {bank}'}
+            rates = self.rates[bank]
+            if self.drift:
+                for code, rate in rates.items():
+                    step = Decimal(str(random.uniform(-self.drift, self.drift)))
+                    rates[code] = (rate * (1 + step)).quantize(Decimal('0.000001'))
+            return 200, {
+                'code': 200,
+                'meta': {'base_currency': 'AFN', 'bank_name': bank, 'country_code': 'AF'},
+                'rates': {code: str(rate) for code, rate in rates.items()},
+            }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = urlparse(self.path).path.strip('/').split('/')
+                if len(parts) == 2 and parts[0] == 'bank':
+                    status, body = server.payload(parts[1].upper())
+                else:
+                    status, body = 404, {'code': 404, 'message': 'Not found'}
+                if server.delay:
+                    time.sleep(server.delay)
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Serve from a daemon thread; returns self"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -1,3 +1,382 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from Core.cache_utils import VERSION_KEY
+from Core.checks import PER_PROCESS_CACHE_BACKENDS
+from Core.models import Currency, sendhawala
+from .compaction import compact_rates, hour_start
+from .fetchers import RateFetchError, circuit_breakers, fetch_and_store_rates, http_session
+from .ingest import RATES_VERSION, known_rates, store_rates, sync_exchange_rates
+from .models import CurrencyRate, CurrencyRateBar, LatestCurrencyRate
+from .stub_server import StubRateServer
+from .stream import rate_broadcaster
+from .views import latest_rates, rate_payloads
+
+
+def bump_in_another_process(name):
+    """Bump a version from a separate interpreter, the way the Celery worker does"""
+    script = f"import django; django.setup(); from Core.cache_utils import bump_version; bump_version({name!r})"
+    subprocess.run([sys.executable, "-c", script], check=True, env=os.environ, cwd=settings.BASE_DIR)
+
+
+class LatestCurrencyRateTestCase(TestCase):
+    meta = {"base_currency": "AFN", "bank_name": "AFCB", "country_code": "AF"}
+
+    def setUp(self):
+        cache.clear()
+        rate_payloads.clear()
+        known_rates.clear()
+
+    def test_fetches_append_history_and_upsert_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(store_rates(self.meta, {"USD": "70.5", "EUR": "76.1"}), 2)
+        first_check = LatestCurrencyRate.objects.get(currency_code="EUR").last_checked
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(store_rates(self.meta, {"USD": 71.0, "EUR": 76.1}), 1)
+
+        # Only the changed rate is written again; the unchanged one gets a heartbeat
+        self.assertEqual(CurrencyRate.objects.count(), 3)
+        self.assertEqual(
+            dict(LatestCurrencyRate.objects.values_list("currency_code", "rate")),
+            {"USD": Decimal("71.000000"), "EUR": Decimal("76.100000")},
+        )
+        eur = LatestCurrencyRate.objects.get(currency_code="EUR")
+        self.assertGreater(eur.last_checked, first_check)
+        self.assertEqual(eur.date_fetched, first_check)
+
+    def test_rates_stored_by_another_process_are_compared_against(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.0"})
+
+        # Another process stores 71 and bumps the version
+        LatestCurrencyRate.objects.filter(currency_code="USD").update(rate=Decimal("71.0"))
+        caches.create_connection("default").incr(VERSION_KEY.format(RATES_VERSION))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(store_rates(self.meta, {"USD": "70.0"}), 1)
+        self.assertEqual(LatestCurrencyRate.objects.get(currency_code="USD").rate, Decimal("70.000000"))
+
+    def test_winning_bank_follows_source_priority_not_heartbeats(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.0"})
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(dict(self.meta, bank_name="AIB"), {"USD": "69.0"})
+        # Unlisted banks: the last change wins
+        with override_settings(CURRENCY_RATE_SOURCES=[]):
+            self.assertEqual([rate.bank_name for rate in latest_rates()], ["AIB"])
+
+        with override_settings(CURRENCY_RATE_SOURCES=["AFCB", "AIB"]):
+            self.assertEqual([rate.bank_name for rate in latest_rates()], ["AFCB"])
+            # A heartbeat of the other bank does not flip it
+            with self.captureOnCommitCallbacks(execute=True):
+                store_rates(dict(self.meta, bank_name="AIB"), {"USD": "69.0"})
+            self.assertEqual([rate.bank_name for rate in latest_rates()], ["AFCB"])
+
+    def test_latest_endpoint_reads_snapshot_in_constant_queries(self):
+        Currency.objects.create(code="USD", name="US Dollar", name_farsi="دالر", symbol="$")
+        store_rates(self.meta, {code: "1.5" for code in ("USD", "EUR", "GBP", "PKR", "IRR")})
+
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/currency/latest/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_currencies"], 5)
+        self.assertEqual(response.data["rates"]["USD"]["name_farsi"], "دالر")
+        self.assertNotIn("name", response.data["rates"]["EUR"])
+
+    def test_polls_are_served_from_cache_until_the_next_fetch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.5"})
+        self.assertEqual(self.client.get("/api/currency/rates/").data[0]["rate"], "70.500000")
+
+        with self.assertNumQueries(0):
+            self.client.get("/api/currency/rates/")
+            self.client.get("/api/currency/rates/")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "71.0"})
+        self.assertEqual(self.client.get("/api/currency/rates/").data[0]["rate"], "71.000000")
+
+    def test_payloads_rebuild_when_another_process_bumps_the_rates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.5"})
+        self.assertEqual(self.client.get("/api/currency/rates/").data[0]["rate"], "70.500000")
+
+        # The Celery worker stores a rate and bumps the version through its own cache connection
+        LatestCurrencyRate.objects.filter(currency_code="USD").update(rate=Decimal("71.0"))
+        caches.create_connection("default").incr(VERSION_KEY.format(RATES_VERSION))
+
+        self.assertEqual(self.client.get("/api/currency/rates/").data[0]["rate"], "71.000000")
+
+    def test_unchanged_rates_are_answered_with_304(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.5"})
+        response = self.client.get("/api/currency/rate/usd/")
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/currency/rate/usd/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Each URL has its own ETag
+        self.assertEqual(self.client.get("/api/currency/latest/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # A new rate or a currency change invalidates it
+        with self.captureOnCommitCallbacks(execute=True):
+            Currency.objects.create(code="USD", name="US Dollar", symbol="$")
+        response = self.client.get("/api/currency/rate/usd/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "71.0"})
+        response = self.client.get("/api/currency/rate/usd/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.data["rate"], Decimal("71.000000"))
+
+    @skipIf(settings.CACHES["default"]["BACKEND"] in PER_PROCESS_CACHE_BACKENDS,
+            "needs a cache shared between processes")
+    def test_304_ends_when_another_process_bumps_the_rates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.5"})
+        etag = self.client.get("/api/currency/rate/usd/")["ETag"]
+        self.assertEqual(self.client.get("/api/currency/rate/usd/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        LatestCurrencyRate.objects.filter(currency_code="USD").update(rate=Decimal("71.0"))
+        bump_in_another_process(RATES_VERSION)
+
+        response = self.client.get("/api/currency/rate/usd/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["rate"], Decimal("71.000000"))
+
+    def test_cross_rates_triangulate_through_the_base(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, {"USD": "70.0", "EUR": "77.0", "PKR": "0.25"})
+            store_rates(dict(self.meta, bank_name="HBL", base_currency="USD"), {"EUR": "1.2", "GBP": "1.3"})
+
+        matrix = self.client.get("/api/currency/cross-rates/").data
+        self.assertEqual(matrix["currencies"], ["AFN", "EUR", "PKR", "USD"])
+        usd = matrix["currencies"].index("USD")
+        self.assertEqual(matrix["rates"][usd], [70.0, 0.90909091, 280.0, 1.0])
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/currency/cross-rates/eur/usd/")
+        self.assertEqual(response.data["rate"], 1.1)
+        self.assertEqual(self.client.get("/api/currency/cross-rates/usd/xxx/").status_code, 404)
+
+    def test_sync_converts_rates_to_the_default_currency(self):
+        Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_default=True)
+        Currency.objects.create(code="AFN", name="Afghani", symbol="؋")
+        Currency.objects.create(code="PKR", name="Rupee", symbol="Rs")
+        store_rates(self.meta, {"USD": "70.0", "PKR": "0.25"})
+
+        # Default currency, snapshot, currencies and a single UPDATE
+        with self.assertNumQueries(4):
+            self.assertEqual(sync_exchange_rates(), 2)
+        self.assertEqual(
+            dict(Currency.objects.values_list("code", "exchange_rate")),
+            {"USD": Decimal("1.000000"), "AFN": Decimal("70.000000"), "PKR": Decimal("280.000000")},
+        )
+        self.assertEqual(sync_exchange_rates(), 0)
+
+        # A source quoting in another base is not mixed in, even when checked last
+        store_rates(dict(self.meta, bank_name="HBL", base_currency="USD"), {"PKR": "0.0036"})
+        self.assertEqual(sync_exchange_rates(), 0)
+
+    def test_synced_rates_convert_hawalas_to_the_default_currency(self):
+        usd = Currency.objects.create(code="USD", name="US Dollar", symbol="$", is_default=True)
+        afn = Currency.objects.create(code="AFN", name="Afghani", symbol="؋")
+        store_rates(self.meta, {"USD": "70.0"})
+        sync_exchange_rates()
+
+        hawala = sendhawala.objects.create(
+            sender_name="Sender", receiver_name="Receiver", amount=Decimal("700.00"), currency=afn,
+            hawala_fee=Decimal("35.00"), hawala_fee_currency=afn, receiver_location="Kabul",
+            exchanger_location="Herat", sender_phone="0700000001",
+        )
+        hawala.refresh_from_db()
+        self.assertEqual(hawala.get_amount_in_default_currency(usd), Decimal("10.00"))
+        self.assertEqual(hawala.get_fee_in_default_currency(usd), Decimal("0.50"))
+
+        annotated = sendhawala.objects.with_default_currency_amounts().get(pk=hawala.pk)
+        self.assertEqual(annotated.amount_in_default, Decimal("10.00"))
+        self.assertEqual(annotated.fee_in_default, Decimal("0.50"))
+
+
+class CurrencyRateCompactionTestCase(TestCase):
+    def _point(self, moment, rate):
+        point = CurrencyRate.objects.create(currency_code="USD", rate=rate, base_currency="AFN",
+                                            bank_name="AFCB", country_code="AF")
+        CurrencyRate.objects.filter(pk=point.pk).update(date_fetched=moment)
+
+    def test_old_points_become_bars_and_are_pruned(self):
+        day = timezone.make_aware(datetime(2024, 1, 15))
+        for minutes, rate in ((0, "70.0"), (20, "72.0"), (40, "69.0"), (70, "71.0"), (130, "70.5")):
+            self._point(day + timedelta(hours=9, minutes=minutes), rate)
+
+        days, daily_bars, deleted = compact_rates(retention_days=30, batch_size=2)
+
+        hours = CurrencyRateBar.objects.filter(interval="hour").order_by("period_start")
+        self.assertEqual(
+            [(bar.open, bar.high, bar.low, bar.close, bar.sample_count) for bar in hours][0],
+            (Decimal("70"), Decimal("72"), Decimal("69"), Decimal("69"), 3),
+        )
+        self.assertEqual(hours.count(), 3)
+        daily = CurrencyRateBar.objects.get(interval="day")
+        self.assertEqual((daily.open, daily.high, daily.low, daily.close, daily.sample_count),
+                         (Decimal("70"), Decimal("72"), Decimal("69"), Decimal("70.5"), 5))
+        self.assertEqual((days, daily_bars, deleted), (1, 1, 5))
+        self.assertFalse(CurrencyRate.objects.exists())
+
+        # A second pass has nothing new to compact
+        self.assertEqual(compact_rates(), (0, 0, 0))
+
+    def test_history_combines_bars_with_uncompacted_points(self):
+        start = hour_start(timezone.now()) - timedelta(hours=3)
+        for minutes, rate in ((10, "70.0"), (50, "72.0"), (65, "71.0")):
+            self._point(start + timedelta(minutes=minutes), rate)
+        compact_rates(prune=False)
+        # Fetched in the current hour, not compacted yet
+        CurrencyRate.objects.create(currency_code="USD", rate="73.0", base_currency="AFN",
+                                    bank_name="AFCB", country_code="AF")
+        LatestCurrencyRate.objects.create(currency_code="USD", rate="73.0", base_currency="AFN",
+                                          bank_name="AFCB", country_code="AF", date_fetched=timezone.now())
+        url = "/api/currency/rates/usd/history/"
+
+        response = self.client.get(url, {"from": start.isoformat(), "interval": "hour"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bank_name"], "AFCB")
+        self.assertEqual(response.data["close"], [72.0, 71.0, 73.0])
+        self.assertEqual(response.data["count"], [2, 1, 1])
+        self.assertEqual(response.data["t"][0], int(start.timestamp()))
+
+        response = self.client.get(url, {"from": start.isoformat()})
+        self.assertEqual(response.data["interval"], "raw")
+        self.assertEqual(response.data["rate"], [70.0, 72.0, 71.0, 73.0])
+
+        self.assertEqual(self.client.get(url, {"interval": "week"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/currency/rates/xxx/history/").status_code, 404)
+
+
+    def test_history_of_a_flat_window_carries_the_previous_rate(self):
+        day = timezone.make_aware(datetime(2024, 1, 15))
+        self._point(day + timedelta(hours=9), "70.0")
+        self._point(day + timedelta(hours=15), "71.0")
+        flat = {"from": (day + timedelta(hours=12)).isoformat(), "to": (day + timedelta(hours=14)).isoformat(),
+                "bank": "AFCB"}
+        url = "/api/currency/rates/usd/history/"
+
+        response = self.client.get(url, dict(flat, interval="raw"))
+        self.assertEqual(response.data["t"], [int((day + timedelta(hours=9)).timestamp())])
+        self.assertEqual(response.data["rate"], [70.0])
+
+        # Still known once the raw points are compacted and pruned
+        compact_rates(retention_days=0)
+        response = self.client.get(url, dict(flat, interval="hour"))
+        self.assertEqual(response.data["t"], [int((day + timedelta(hours=12)).timestamp())])
+        self.assertEqual(response.data["close"], [70.0])
+        self.assertEqual(response.data["count"], [0])
+
+@override_settings(CURRENCY_RATE_SOURCES=["AFCB", "AIB", "AUB"], CURRENCY_RATE_FETCH_RETRIES=0,
+                   CURRENCY_RATE_BREAKER_THRESHOLD=2)
+class RateFetcherTestCase(TestCase):
+    def setUp(self):
+        known_rates.clear()
+        for memo in (http_session, circuit_breakers):
+            memo.clear()
+            self.addCleanup(memo.clear)
+        self.server = StubRateServer(banks=["AFCB", "AIB", "AUB"], rates={"USD": "70.5", "EUR": "76.1"},
+                                     failing=["AUB"]).start()
+        self.addCleanup(self.server.stop)
+
+    def test_sources_are_fetched_together_and_failing_ones_are_broken_off(self):
+        with self.settings(BANKFX_BASE_URL=self.server.url):
+            with self.captureOnCommitCallbacks(execute=True):
+                changed, errors = fetch_and_store_rates()
+            self.assertEqual(changed, {"AFCB": 2, "AIB": 2})
+            self.assertEqual(list(errors), ["AUB"])
+
+            fetch_and_store_rates()
+            self.assertEqual(self.server.requests, 6)
+            # Two failures in a row open AUB's circuit: it is no longer requested
+            changed, errors = fetch_and_store_rates()
+            self.assertEqual(self.server.requests, 8)
+            self.assertEqual(changed, {"AFCB": 0, "AIB": 0})
+            self.assertIn("Circuit open", errors["AUB"])
+
+            self.assertEqual(set(LatestCurrencyRate.objects.values_list("bank_name", flat=True)), {"AFCB", "AIB"})
+            with self.assertRaises(RateFetchError):
+                fetch_and_store_rates(["AUB"])
+
+
+@override_settings(RATE_STREAM_POLL_INTERVAL=0.01)
+class RateStreamTestCase(TestCase):
+    meta = {"base_currency": "AFN", "bank_name": "AFCB", "country_code": "AF"}
+
+    def setUp(self):
+        cache.clear()
+        rate_payloads.clear()
+        known_rates.clear()
+
+    def store(self, rates):
+        with self.captureOnCommitCallbacks(execute=True):
+            store_rates(self.meta, rates)
+
+    def data(self, event):
+        return json.loads(next(line for line in event.splitlines() if line.startswith("data: "))[len("data: "):])
+
+    async def test_stream_sends_snapshot_then_only_changed_currencies(self):
+        await sync_to_async(self.store)({"USD": "70.5", "EUR": "76.1"})
+        response = await self.async_client.get("/api/currency/stream/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = aiter(response.streaming_content)
+
+        snapshot = (await anext(events)).decode()
+        self.assertTrue(snapshot.startswith("event: snapshot\n"))
+        self.assertEqual(set(self.data(snapshot)), {"USD", "EUR"})
+
+        await sync_to_async(self.store)({"USD": "71.0", "EUR": "76.1"})
+        update = (await asyncio.wait_for(anext(events), timeout=5)).decode()
+        self.assertTrue(update.startswith("event: rates\n"))
+        changes = self.data(update)
+        self.assertEqual(list(changes), ["USD"])
+        self.assertEqual(changes["USD"]["rate"], 71.0)
+        await events.aclose()
+
+    @override_settings(RATE_STREAM_POLL_INTERVAL=0.05)
+    async def test_stream_survives_a_failing_poll(self):
+        await sync_to_async(self.store)({"USD": "70.5"})
+        response = await self.async_client.get("/api/currency/stream/")
+        events = aiter(response.streaming_content)
+        await anext(events)
+
+        refresh = rate_broadcaster._refresh
+        failures = []
+
+        async def flaky_refresh():
+            if not failures:
+                failures.append(True)
+                raise ConnectionError("cache unavailable")
+            return await refresh()
+
+        with mock.patch.object(rate_broadcaster, "_refresh", flaky_refresh), \
+                self.assertLogs("currency_ratee.stream", "ERROR"):
+            await sync_to_async(self.store)({"USD": "71.0"})
+            update = (await asyncio.wait_for(anext(events), timeout=5)).decode()
+        self.assertEqual(failures, [True])
+        self.assertEqual(self.data(update)["USD"]["rate"], 71.0)
+        await events.aclose()
+
+    def test_stream_is_refused_under_wsgi(self):
+        # Each client would hold a worker thread for good
+        self.assertEqual(self.client.get("/api/currency/stream/").status_code, 503)
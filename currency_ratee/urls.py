@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import stream, views
 
 urlpatterns = [
     # Get all latest rates (detailed format)
@@ -7,8 +7,18 @@ urlpatterns = [
     
     # Get latest rate for specific currency (detailed format)
     path('rates/<str:currency_code>/', views.CurrencyRateDetailView.as_view(), name='currency-rate-detail'),
+
+    # Rate history of a currency as columnar arrays
+    path('rates/<str:currency_code>/history/', views.CurrencyRateHistoryView.as_view(), name='currency-rate-history'),
     
     # Simple endpoints
     path('rate/<str:currency_code>/', views.currency_rate_by_code, name='currency-rate-simple'),
     path('latest/', views.all_latest_rates, name='all-latest-rates'),
+
+    # Cross rates between every pair of currencies, or one pair
+    path('cross-rates/', views.cross_rates, name='cross-rates'),
+    path('cross-rates/<str:from_code>/<str:to_code>/', views.cross_rate_pair, name='cross-rate-pair'),
+
+    # Server-Sent Events: snapshot on connect, then changed currencies (ASGI only)
+    path('stream/', stream.rate_stream, name='currency-rate-stream'),
 ]
@@ -1,58 +1,151 @@
+from datetime import datetime, time, timedelta
+
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
+from rest_framework.views import APIView
 from django.db.models import Q
-from .models import CurrencyRate
-from .serializers import CurrencyRateSerializer
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import LatestCurrencyRate
+from .serializers import LatestCurrencyRateSerializer
+from django.conf import settings
+from Core.cache_utils import VersionedCache
+from Core.conditional import versioned_condition
 from Core.models import Currency
+from .cross_rates import build_cross_rates, cross_rate
+from .history import INTERVALS, default_interval, rate_history
+from .ingest import RATES_VERSION, preferred_first
+
+# Rendered payloads of the polled endpoints, invalidated by every rate fetch
+rate_payloads = VersionedCache(RATES_VERSION, timeout=settings.RATES_CACHE_TIMEOUT)
+
+# Rate responses carry currency names too, so they change with either resource
+rates_condition = versioned_condition(RATES_VERSION, 'currencies')
+
+
+def latest_rates(currency_code=None, base_currency=None):
+    """
+    Latest rate per currency from the LatestCurrencyRate snapshot, optionally
+    only among rates quoted in `base_currency`; when several banks quote a
+    currency the preferred one wins (see ingest.preferred_first).
+    """
+    snapshot = preferred_first(LatestCurrencyRate.objects.all())
+    if currency_code:
+        snapshot = snapshot.filter(currency_code=currency_code)
+    if base_currency:
+        snapshot = snapshot.filter(base_currency=base_currency)
+    rates = {}
+    for rate in snapshot:
+        rates.setdefault(rate.currency_code, rate)
+    return list(rates.values())
+
+
+def currency_details(codes):
+    """Core.Currency names and symbol by code, in one query"""
+    return {
+        currency['code']: currency
+        for currency in Currency.objects.filter(code__in=codes).values(
+            'code', 'name', 'name_english', 'name_farsi', 'symbol'
+        )
+    }
 
 
 class CurrencyRateListView(generics.ListAPIView):
     """Get all latest currency rates"""
-    serializer_class = CurrencyRateSerializer
+    serializer_class = LatestCurrencyRateSerializer
     
     def get_queryset(self):
         # Get the latest rate for each currency
-        latest_rates = []
-        currencies = CurrencyRate.objects.values_list('currency_code', flat=True).distinct()
-        
-        for currency in currencies:
-            latest_rate = CurrencyRate.objects.filter(
-                currency_code=currency
-            ).order_by('-date_fetched').first()
-            if latest_rate:
-                latest_rates.append(latest_rate)
-        
-        return latest_rates
+        return latest_rates()
+
+    def list(self, request, *args, **kwargs):
+        data = rate_payloads.get('rates', lambda: list(self.get_serializer(self.get_queryset(), many=True).data))
+        return Response(data)
 
 
 class CurrencyRateDetailView(generics.ListAPIView):
     """Get latest rate for a specific currency"""
-    serializer_class = CurrencyRateSerializer
+    serializer_class = LatestCurrencyRateSerializer
     
     def get_queryset(self):
         currency_code = self.kwargs.get('currency_code', '').upper()
-        return CurrencyRate.objects.filter(
-            currency_code=currency_code
-        ).order_by('-date_fetched')[:1]
+        return latest_rates(currency_code)
+
+
+def parse_moment(value):
+    """Aware datetime from an ISO datetime or a date (its local midnight); None if invalid"""
+    try:
+        moment = parse_datetime(value)
+        if moment is None:
+            day = parse_date(value)
+            moment = day and datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if moment is not None and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class CurrencyRateHistoryView(APIView):
+    def get(self, request, currency_code):
+        """
+        Rate history of a currency as columnar arrays.
+        Query parameters: from, to (ISO date or datetime, default the last day),
+        interval (raw | hour | day, default by range length), bank (default the
+        bank of the latest rate)
+        """
+        currency_code = currency_code.upper()
+        moments = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            if value:
+                moments[param] = parse_moment(value)
+                if moments[param] is None:
+                    return Response({
+                        'error': f'Invalid {param}. Use ISO format YYYY-MM-DD or YYYY-MM-DDTHH:MM'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+        date_to = moments.get('to') or timezone.now()
+        date_from = moments.get('from') or date_to - timedelta(days=1)
+        if date_from >= date_to:
+            return Response({'error': 'from must be before to'}, status=status.HTTP_400_BAD_REQUEST)
+
+        interval = request.query_params.get('interval') or default_interval(date_from, date_to)
+        if interval not in INTERVALS:
+            return Response({
+                'error': f'Invalid interval. Valid options are: {", ".join(INTERVALS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        bank_name = request.query_params.get('bank')
+        if not bank_name:
+            latest = latest_rates(currency_code)
+            if not latest:
+                return Response(
+                    {'error': f'Currency {currency_code} not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            bank_name = latest[0].bank_name
+
+        return Response(rate_history(currency_code, bank_name, date_from, date_to, interval))
 
 
 @api_view(['GET'])
+@rates_condition
 def currency_rate_by_code(request, currency_code):
     """Get latest rate for a specific currency with English and Farsi names"""
     try:
-        latest_rate = CurrencyRate.objects.filter(
-            currency_code=currency_code.upper()
-        ).order_by('-date_fetched').first()
+        latest = latest_rates(currency_code.upper())
         
-        if not latest_rate:
+        if not latest:
             return Response(
                 {'error': f'Currency {currency_code.upper()} not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        latest_rate = latest[0]
+        
         # Get currency details from Core.Currency model
-        currency_details = Currency.objects.filter(code=currency_code.upper()).first()
+        details = currency_details([latest_rate.currency_code]).get(latest_rate.currency_code)
         
         response_data = {
             'currency_code': latest_rate.currency_code,
@@ -64,12 +157,12 @@ def currency_rate_by_code(request, currency_code):
         }
         
         # Add currency names if available
-        if currency_details:
+        if details:
             response_data.update({
-                'name': currency_details.name,
-                'name_english': currency_details.name_english,
-                'name_farsi': currency_details.name_farsi,
-                'symbol': currency_details.symbol
+                'name': details['name'],
+                'name_english': details['name_english'],
+                'name_farsi': details['name_farsi'],
+                'symbol': details['symbol']
             })
         
         return Response(response_data)
@@ -81,46 +174,74 @@ def currency_rate_by_code(request, currency_code):
         )
 
 
+def build_latest_rates_payload():
+    """Payload of all_latest_rates"""
+    # Get latest rate for each currency
+    latest = latest_rates()
+    details_by_code = currency_details([rate.currency_code for rate in latest])
+    rates_data = {}
+    
+    for latest_rate in latest:
+        rate_info = {
+            'rate': float(latest_rate.rate),
+            'base_currency': latest_rate.base_currency,
+            'bank_name': latest_rate.bank_name,
+            'last_updated': latest_rate.date_fetched
+        }
+        
+        # Add currency names if available
+        details = details_by_code.get(latest_rate.currency_code)
+        if details:
+            rate_info.update({
+                'name': details['name'],
+                'name_english': details['name_english'],
+                'name_farsi': details['name_farsi'],
+                'symbol': details['symbol']
+            })
+        
+        rates_data[latest_rate.currency_code] = rate_info
+    
+    return {
+        'success': True,
+        'rates': rates_data,
+        'total_currencies': len(rates_data)
+    }
+
+
+def cross_rate_matrix():
+    base_currency = settings.CURRENCY_RATE_BASE
+    return rate_payloads.get('cross', lambda: build_cross_rates(latest_rates(base_currency=base_currency),
+                                                                base_currency))
+
+
 @api_view(['GET'])
+@rates_condition
+def cross_rates(request):
+    """All cross rates: rates[i][j] = units of currencies[j] per unit of currencies[i]"""
+    return Response(cross_rate_matrix())
+
+
+@api_view(['GET'])
+@rates_condition
+def cross_rate_pair(request, from_code, to_code):
+    """Units of to_code one unit of from_code buys"""
+    from_code, to_code = from_code.upper(), to_code.upper()
+    matrix = cross_rate_matrix()
+    rate = cross_rate(matrix, from_code, to_code)
+    if rate is None:
+        return Response(
+            {'error': f'No rate for {from_code} to {to_code}'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response({'from': from_code, 'to': to_code, 'rate': rate, 'as_of': matrix['as_of']})
+
+
+@api_view(['GET'])
+@rates_condition
 def all_latest_rates(request):
     """Get all latest rates with English and Farsi names"""
     try:
-        # Get latest rate for each currency
-        currencies = CurrencyRate.objects.values_list('currency_code', flat=True).distinct()
-        rates_data = {}
-        
-        for currency in currencies:
-            latest_rate = CurrencyRate.objects.filter(
-                currency_code=currency
-            ).order_by('-date_fetched').first()
-            
-            if latest_rate:
-                # Get currency details from Core.Currency model
-                currency_details = Currency.objects.filter(code=currency).first()
-                
-                rate_info = {
-                    'rate': float(latest_rate.rate),
-                    'base_currency': latest_rate.base_currency,
-                    'bank_name': latest_rate.bank_name,
-                    'last_updated': latest_rate.date_fetched
-                }
-                
-                # Add currency names if available
-                if currency_details:
-                    rate_info.update({
-                        'name': currency_details.name,
-                        'name_english': currency_details.name_english,
-                        'name_farsi': currency_details.name_farsi,
-                        'symbol': currency_details.symbol
-                    })
-                
-                rates_data[currency] = rate_info
-        
-        return Response({
-            'success': True,
-            'rates': rates_data,
-            'total_currencies': len(rates_data)
-        })
+        return Response(rate_payloads.get('latest', build_latest_rates_payload))
     
     except Exception as e:
         return Response(
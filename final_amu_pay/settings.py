@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -128,6 +128,19 @@ DATABASES = {
     }
 }
 
+# Cache
+# Holds the version counters of the in-process indexes (Core.cache_utils), so it
+# must be shared by every web process and Celery worker: a bump made by the rate
+# fetch task has to reach the web processes. Defaults to the Redis server the
+# Celery broker runs on. A per-process backend (locmem, dummy) is only fit for a
+# single process and is reported by the Core.W001 / Core.E001 checks.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default='redis://localhost:6379/1'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -208,6 +221,51 @@ if DEBUG:
 BANKFX_BASE_URL = config('BANKFX_BASE_URL', default='https://api.bankfxapi.com/v1')
 BANKFX_API_KEY = config('BANKFX_API_KEY', default='43088180beddf039ac6bfde3e11d71453f5d6237')
 
+# BankFX bank codes polled concurrently on every fetch
+CURRENCY_RATE_SOURCES = config('CURRENCY_RATE_SOURCES', default='AFCB', cast=Csv())
+CURRENCY_RATE_FETCH_WORKERS = config('CURRENCY_RATE_FETCH_WORKERS', default=8, cast=int)
+# Base currency the rates are quoted in; rows quoted in another base are not
+# mixed into Currency.exchange_rate or the cross rates
+CURRENCY_RATE_BASE = config('CURRENCY_RATE_BASE', default='AFN')
+# Per request timeouts (seconds) and retries with exponential backoff
+CURRENCY_RATE_CONNECT_TIMEOUT = config('CURRENCY_RATE_CONNECT_TIMEOUT', default=3, cast=float)
+CURRENCY_RATE_READ_TIMEOUT = config('CURRENCY_RATE_READ_TIMEOUT', default=10, cast=float)
+CURRENCY_RATE_FETCH_RETRIES = config('CURRENCY_RATE_FETCH_RETRIES', default=2, cast=int)
+CURRENCY_RATE_FETCH_BACKOFF = config('CURRENCY_RATE_FETCH_BACKOFF', default=0.5, cast=float)
+# A source failing this many fetches in a row is skipped for the cooldown (seconds)
+CURRENCY_RATE_BREAKER_THRESHOLD = config('CURRENCY_RATE_BREAKER_THRESHOLD', default=3, cast=int)
+CURRENCY_RATE_BREAKER_COOLDOWN = config('CURRENCY_RATE_BREAKER_COOLDOWN', default=300, cast=int)
+
+# Rate stream (SSE): seconds between rates version checks, and between
+# keepalive comments on an idle connection
+RATE_STREAM_POLL_INTERVAL = config('RATE_STREAM_POLL_INTERVAL', default=1, cast=float)
+RATE_STREAM_KEEPALIVE = config('RATE_STREAM_KEEPALIVE', default=15, cast=float)
+
+# Seconds a rendered rate payload is kept in the shared cache (entries are
+# keyed by the rates version, so a new fetch invalidates them immediately)
+RATES_CACHE_TIMEOUT = config('RATES_CACHE_TIMEOUT', default=600, cast=int)
+# Seconds an encoded currency catalogue is kept in the shared cache (keyed by
+# the catalogue version, so superseded versions just expire)
+CURRENCY_CATALOGUE_CACHE_TIMEOUT = config('CURRENCY_CATALOGUE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Raw currency rates older than this are deleted once rolled into bars,
+# in batches of CURRENCY_RATE_PRUNE_BATCH_SIZE rows
+CURRENCY_RATE_RETENTION_DAYS = config('CURRENCY_RATE_RETENTION_DAYS', default=30, cast=int)
+CURRENCY_RATE_PRUNE_BATCH_SIZE = config('CURRENCY_RATE_PRUNE_BATCH_SIZE', default=5000, cast=int)
+
+# Page sizes for cursor paginated API lists
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=50, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+
+# Hawala numbers are reserved in blocks of this size per worker process
+NUMBER_SEQUENCE_BLOCK_SIZE = config('NUMBER_SEQUENCE_BLOCK_SIZE', default=50, cast=int)
+
+# Largest batch accepted by the bulk hawala endpoint
+HAWALA_BULK_MAX_ROWS = config('HAWALA_BULK_MAX_ROWS', default=1000, cast=int)
+
+# Largest number of conversions accepted by the batch conversion endpoint
+CURRENCY_CONVERT_MAX_ROWS = config('CURRENCY_CONVERT_MAX_ROWS', default=10000, cast=int)
+
 # Celery Configuration
 CELERY_TIMEZONE = 'Asia/Kabul'
 CELERY_TASK_TRACK_STARTED = True
@@ -216,11 +274,16 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
-# Celery beat schedule: fetch currency rates every 60 seconds
+# Celery beat schedule: fetch currency rates every 60 seconds and compact
+# the raw rate history into hourly / daily bars once an hour
 CELERY_BEAT_SCHEDULE = {
     'fetch-currency-rates-every-minute': {
         'task': 'currency_ratee.tasks.fetch_currency_rates',
         'schedule': 60.0,  # seconds
     },
+    'compact-currency-rates-every-hour': {
+        'task': 'currency_ratee.tasks.compact_currency_rates',
+        'schedule': 3600.0,  # seconds
+    },
 }
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
\ No newline at end of file